@@ -7,6 +7,7 @@ from io import BytesIO
 
 import constants as const
 from utils import auth_utils as auth
+from utils import keep_warm
 
 # Import services
 from services import (
@@ -99,6 +100,13 @@ else:
         "Describe Image with YourDesigner", "Remix Image", "Reimagine with Modification"
     ])
 
+    # Keep the GPU endpoints warm and wake the ones behind the chosen service before it is used
+    keep_warm.start()
+    warm_routes = const.SERVICE_WARM_ROUTES.get(service_choice)
+    if warm_routes:
+        keep_warm.prewarm(warm_routes)
+        st.sidebar.caption(f"GPU workers: {keep_warm.route_state(warm_routes)}")
+
     # Now call the appropriate service
     if service_choice == "Upscale Image":
         upscale_image.run()
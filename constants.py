@@ -4,6 +4,158 @@
 UPSCALE_SERVICE_URL = "https://your-upscale-service-url.com/upscale"
 RESIZE_WITH_BLEED_SERVICE_URL = "https://your-resize-service-url.com/resize_with_bleed"
 
+# RunPod
+RUNPOD_ENDPOINT_ID = "vdazldfyhyb2kr"
+RUNPOD_SUBMIT_WORKERS = 8  # Concurrent job submissions
+RUNPOD_POLL_INITIAL_INTERVAL = 0.2  # Seconds before the first status check
+RUNPOD_POLL_MAX_INTERVAL = 2.0  # Upper bound for the adaptive poll interval
+RUNPOD_POLL_BACKOFF = 1.5  # Poll interval growth factor while a job is running
+RUNPOD_STATUS_MAX_ERRORS = 5  # Consecutive failed status checks before a job is given up and cancelled
+RUNPOD_SYNC_TIMEOUT = 90  # Seconds to wait on run_sync operations
+RUNPOD_SYNC_OPERATIONS = ["remove_bg"]  # Short operations sent through run_sync
+RUNPOD_PIPELINE_ENABLED = False  # Needs a worker that runs {"type": "pipeline", "model_params": {"steps": [...]}} jobs; otherwise print steps run as separate jobs
+
+# RunPod deadlines and hedging
+RUNPOD_DEADLINES = {  # Seconds from submission before a job is cancelled, per operation
+    "upscale": 600,
+    "outpaint": 300,
+    "remove_bg": 90,
+    "generate": 180,
+    "pipeline": 900,
+}
+RUNPOD_DEFAULT_DEADLINE = 300
+RUNPOD_HEDGE_ENABLED = False  # Duplicate jobs stuck in the queue onto the secondary endpoint
+RUNPOD_HEDGE_ENDPOINT_ID = None  # Secondary endpoint that receives hedged jobs
+RUNPOD_HEDGE_OPERATIONS = ["upscale", "outpaint", "generate", "pipeline"]
+RUNPOD_HEDGE_PERCENTILE = 0.95  # Hedge once a job has been queued longer than this share of recent jobs
+RUNPOD_HEDGE_MIN_SAMPLES = 20  # Queue waits to observe before trusting the percentile
+RUNPOD_HEDGE_DEFAULT_DELAY = 30  # Seconds in the queue before hedging while there are too few samples
+RUNPOD_QUEUE_WAIT_WINDOW = 200  # Recent queue waits kept per endpoint
+
+# RunPod routing
+RUNPOD_ROUTES = {  # Route -> {endpoint ID: weight}; heavy and light workloads can live on separate endpoints
+    "upscale-x2": {RUNPOD_ENDPOINT_ID: 1},
+    "upscale-x4": {RUNPOD_ENDPOINT_ID: 1},
+    "outpaint": {RUNPOD_ENDPOINT_ID: 1},
+    "remove_bg": {RUNPOD_ENDPOINT_ID: 1},
+    "generate": {RUNPOD_ENDPOINT_ID: 1},
+    "pipeline": {RUNPOD_ENDPOINT_ID: 1},
+}
+RUNPOD_HEALTH_INTERVAL = 15  # Seconds between endpoint health samples
+RUNPOD_HEALTH_MAX_AGE = 60  # Older samples are ignored and routing falls back to the weights
+
+# Keep-warm
+KEEP_WARM_ENABLED = False  # Needs a worker that answers {"type": "warmup"} jobs; older workers fail them after a cold start
+KEEP_WARM_INTERVAL = 240  # Seconds without traffic before an endpoint gets a warm-up job; keep below the worker idle timeout
+KEEP_WARM_ACTIVE_HOURS = (7, 23)  # Local hours [start, end) during which idle endpoints are kept warm
+KEEP_WARM_ROUTES = ["outpaint", "remove_bg"]  # Routes kept warm in the background
+KEEP_WARM_PREWARM_COOLDOWN = 60  # Seconds after a submission during which opening a page sends no warm-up job
+KEEP_WARM_DEADLINE = 120  # Seconds before an unanswered warm-up job is cancelled
+SERVICE_WARM_ROUTES = {  # Routes woken up when a GPU-backed service page is opened
+    "Upscale Image": ["upscale-x2", "upscale-x4"],
+    "Resize with Bleed": ["outpaint"],
+    "Remove Background": ["remove_bg"],
+    "Generate Flyer": ["generate"],
+}
+
+# Shared clients
+HTTP_POOL_SIZE = 32  # Keep-alive connections per host
+HTTP_TIMEOUT = (5, 120)  # (connect, read) seconds
+HTTP_MAX_RETRIES = 3
+S3_MAX_POOL_CONNECTIONS = 32
+
+# Ideogram
+IDEOGRAM_API_URL = "https://api.ideogram.ai"
+IDEOGRAM_TIMEOUT = (5, 120)  # (connect, read) seconds; generation can take a while
+IDEOGRAM_MAX_ATTEMPTS = 5
+IDEOGRAM_RETRY_STATUSES = [429, 500, 502, 503, 504]
+IDEOGRAM_BACKOFF_BASE = 1.0  # Seconds; doubled on every retry
+IDEOGRAM_BACKOFF_MAX = 30.0  # Upper bound for a single backoff or Retry-After wait
+IDEOGRAM_MAX_SEED = 2147483647
+IDEOGRAM_DOWNLOAD_WORKERS = 8  # Result images downloaded in parallel
+IDEOGRAM_MAX_IMAGES_PER_REQUEST = 8  # API maximum for num_images
+MAX_VARIANTS = 8  # Upper bound of the variants slider
+
+# OpenAI
+OPENAI_ORGANIZATION = 'org-4WOjbZKBTFaXvKMikqR2SuWx'
+
+BULK_REWRITE_MAX_TOKENS = 6000  # Estimated prompt plus completion tokens per bulk rewrite request
+BULK_REWRITE_MAX_ITEMS = 50  # Prompts per bulk rewrite request
+BULK_REWRITE_WORKERS = 4  # Bulk rewrite requests in flight at once
+
+# Provider rate limits
+RATE_LIMITS = {  # Budgets shared by every session of the app, per provider
+    "ideogram": {"requests_per_minute": 60},
+    "openai": {"requests_per_minute": 500, "tokens_per_minute": 30000},
+}
+RATE_LIMIT_BACKEND = "memory"  # "memory" limits this process, "sqlite" shares the budget between processes on the host
+RATE_LIMIT_DB_PATH = ".cache/rate_limits.sqlite3"
+
+# Input staging
+RUNPOD_INPUT_MODE = "base64"  # "base64" sends the image inline; "s3" sends a staged object key and needs a worker that reads input_s3_bucket/input_s3_key
+INPUT_STAGING_BUCKET = "readytoprint-images"
+INPUT_STAGING_PREFIX = "staging-inputs"
+
+# Result transport
+RESULTS_BUCKET = "readytoprint-images"
+RUNPOD_INLINE_MAX_BYTES = 8 * 1024 * 1024  # Larger results stay in S3 and are fetched from the bucket
+PRESIGNED_DELIVERY = True  # Download large results straight from S3 and only show a preview in the app
+PRESIGNED_URL_EXPIRY = 3600  # Seconds
+PREVIEW_MAX_SIZE = 1024  # Longest side of result previews in pixels
+DPI_PROBE_BYTES = 64 * 1024  # Leading bytes of a result fetched to read its DPI tag
+S3_TRANSFER_PART_SIZE = 8 * 1024 * 1024  # Ranged GET / multipart upload part size
+S3_TRANSFER_CONCURRENCY = 8  # Parts transferred in parallel
+
+# Tiled upscaling
+TILED_UPSCALE_MIN_PIXELS = 4000 * 4000  # Inputs above this many pixels are upscaled tile by tile
+TILED_UPSCALE_TILE_SIZE = 1024  # Input tile edge in pixels
+TILED_UPSCALE_OVERLAP = 64  # Input pixels shared by neighbouring tiles for seam blending
+TILED_UPSCALE_MAX_IN_FLIGHT = 16  # Tiles submitted or buffered at once
+
+# Batched GPU jobs
+GPU_BATCH_ENABLED = False  # Needs a worker that runs {"type": "batch", "operation", "model_params", "items"} jobs and returns {"results": [...]} in item order
+GPU_BATCH_MAX_BYTES = 6 * 1024 * 1024  # Input bytes per batched job; stays under RunPod's 10 MB request limit once base64 encoded
+GPU_BATCH_MAX_ITEMS = 16  # Images per batched job
+GPU_BATCH_ITEM_SECONDS = 20  # Deadline added per image on top of the operation deadline
+GPU_BATCH_INLINE_MAX_BYTES = 1024 * 1024  # Per-image inline result limit; larger results are fetched from S3
+GPU_BATCH_MAX_IN_FLIGHT = 16  # Jobs submitted at once; the rest wait so their deadlines do not start early
+
+# Prompt batches
+BATCH_WORKERS = 8  # Rows generated at once; provider rate limits still bound the request rate
+PIPELINE_QUEUE_SIZE = 8  # Items waiting between two pipeline stages
+REIMAGINE_PREPARE_WORKERS = 2  # Threads decoding and re-encoding ZIP images
+REIMAGINE_DESCRIBE_WORKERS = 4  # GPT-4o descriptions in flight
+REIMAGINE_GENERATE_WORKERS = 4  # Ideogram generations in flight
+REIMAGINE_STORE_WORKERS = 2  # Threads checkpointing finished images
+
+# Resumable batch jobs
+BATCH_JOBS_BACKEND = "s3"  # "s3" keeps manifests and outputs in RESULTS_BUCKET, "local" on this host's disk
+BATCH_JOBS_DIR = ".cache/batch-jobs"
+BATCH_JOBS_S3_PREFIX = "batch-jobs"  # Also worth an S3 lifecycle expiry rule as a backstop for abandoned runs
+BATCH_JOBS_TTL = 7 * 24 * 3600  # Seconds an unfinished run can be resumed before it is deleted
+
+# GPU result cache
+RESULT_CACHE_DIR = ".cache/gpu-results"
+RESULT_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # Local disk budget before LRU eviction
+RESULT_CACHE_S3_ENABLED = False  # Also share cached results through S3
+RESULT_CACHE_S3_PREFIX = "result-cache"
+
+# Generation cache
+GENERATION_CACHE_DIR = ".cache/generations"
+GENERATION_CACHE_MAX_BYTES = 512 * 1024 * 1024  # Local disk budget before LRU eviction
+
+# Vision preprocessing
+VISION_PROFILES = {  # Largest useful input per vision model; anything bigger only costs upload time and tokens
+    "openai": {"max_side": 2048, "short_side": 768, "format": "JPEG", "quality": 85},
+    "openai-low": {"max_side": 512, "short_side": 512, "format": "JPEG", "quality": 85},
+    "ideogram": {"max_side": 1024, "short_side": 1024, "format": "JPEG", "quality": 90},
+}
+VISION_LOW_DETAIL = False  # Send GPT-4o the 512px low-detail version (fixed low token cost)
+
+# Description cache
+DESCRIPTION_CACHE_DIR = ".cache/descriptions"
+DESCRIPTION_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
 # Default Values
 DEFAULT_UPSCALE_FACTOR = 2
 MIN_UPSCALE_FACTOR = 1
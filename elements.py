@@ -1,5 +1,7 @@
 import streamlit as st
 from PIL import Image, ImageDraw
+import constants as const
+from utils.result_transport import presigned_download_url
 
 def sidebar_title(title):
     """Function to display the sidebar title."""
@@ -50,9 +52,17 @@ def display_info_message(message):
     st.info(message)
 
 def download_button(label, data, file_name, mime):
-    """Function to create a download button."""
+    """Function to create a download button. Accepts the bytearray buffers S3 downloads return."""
+    if isinstance(data, (bytearray, memoryview)):
+        # Streamlit only takes bytes, so the copy happens here, at the last moment
+        data = bytes(data)
     st.download_button(label=label, data=data, file_name=file_name, mime=mime)
 
+def presigned_download_button(label, object_key, file_name):
+    """Function to create a download button that fetches the result straight from S3."""
+    url = presigned_download_url(const.RESULTS_BUCKET, object_key, file_name)
+    st.link_button(label, url)
+
 def create_checkerboard(width, height, tile_size=30):
     """Create a checkerboard pattern image."""
     checkerboard = Image.new('RGB', (width, height), color=(255, 255, 255))
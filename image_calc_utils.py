@@ -2,7 +2,11 @@ from PIL import Image
 import streamlit as st
 import io
 import image_calc_utils as img_utils
+from functools import partial
+import constants as const
+import elements as ui
 from utils.server_utils import *
+from utils import result_transport
 
 def get_initial_dimensions(image_bytes):
     """
@@ -23,20 +27,20 @@ def resize_with_bleed_server(image_bytes, width_px, height_px, bleed_w_px, bleed
     """
     Calls the server function to resize the image and add bleed in pixels.
     """
-    resized_image, image_bytes = resize_with_bleed_func(image_bytes, width_px, height_px, bleed_w_px, bleed_h_px)
-    return resized_image, image_bytes
+    resized_image, image_bytes, s3_key = resize_with_bleed_func(image_bytes, width_px, height_px, bleed_w_px, bleed_h_px)
+    return resized_image, image_bytes, s3_key
 
-def process_image_smaller_than_format(image_bytes, format_width_px, format_height_px, resize_with_bleed_func):
+def process_image_smaller_than_format(image_bytes, format_width_px, format_height_px, resize_with_bleed_func, upscale_factor=1):
     """
     Process an image that is smaller than the selected format by adding bleed.
+    When the server upscales the image first, the bleed is computed for the upscaled size.
     """
     image = Image.open(BytesIO(image_bytes))
-    original_width_px, original_height_px = image.size
+    original_width_px, original_height_px = round(image.width * upscale_factor), round(image.height * upscale_factor)
     bleed_w_px = (format_width_px - original_width_px) 
     bleed_h_px = (format_height_px - original_height_px) 
 
-    resized_image, image_bytes = resize_with_bleed_server(image_bytes, original_width_px, original_height_px, bleed_w_px, bleed_h_px, resize_with_bleed_func)
-    return resized_image, image_bytes
+    return resize_with_bleed_server(image_bytes, original_width_px, original_height_px, bleed_w_px, bleed_h_px, resize_with_bleed_func)
 
 def process_image_larger_than_format(image_bytes, format_width_px, format_height_px, resize_option, resize_with_bleed_func):
     """
@@ -76,7 +80,8 @@ def process_image_larger_than_format(image_bytes, format_width_px, format_height
             # Save the cropped image to bytes
             buffered = io.BytesIO()
             cropped_image.save(buffered, format="PNG", dpi=(300, 300))
-            return cropped_image, buffered.getvalue()
+            # Cropping happens locally, so there is no S3 object for this result
+            return cropped_image, buffered.getvalue(), None
         else:
             # Slightly reduce the image size to create space for bleed
             reduction_factor = 0.9  # Reduce size by 10% to create space for bleed
@@ -101,10 +106,9 @@ def process_image_larger_than_format(image_bytes, format_width_px, format_height
             diff_h = format_height_px - resized_height_px
 
             # Add bleed to fill the gap
-            final_image, final_image_bytes = resize_with_bleed_server(
+            return resize_with_bleed_server(
                 resized_image_bytes, resized_width_px, resized_height_px, diff_w / 2, diff_h / 2, resize_with_bleed_func
             )
-            return final_image, final_image_bytes
         
 def set_image_dpi(image, dpi=(300, 300)):
     """
@@ -113,39 +117,64 @@ def set_image_dpi(image, dpi=(300, 300)):
     image.info['dpi'] = dpi
     return image
 
-def process_and_display_image(img_bytes, format_width_px, format_height_px, resize_option):
+def process_and_display_image(img_bytes, format_width_px, format_height_px, resize_option, remove_bg=False, upscale_factor=1):
     """
     Handles the logic for processing the image based on the user-defined width and height in pixels.
+    The background can be removed and small images upscaled on the server before the bleed is added.
     """
     # Get initial dimensions in pixels
     image = Image.open(BytesIO(img_bytes))
     initial_width_px, initial_height_px = image.size
 
     if initial_width_px < format_width_px and initial_height_px < format_height_px:
+        # Upscaling only helps while the upscaled image still fits the format
+        if initial_width_px * upscale_factor > format_width_px or initial_height_px * upscale_factor > format_height_px:
+            if upscale_factor > 1:
+                st.info(f"Skipping the x{upscale_factor} upscale: the upscaled image would be larger than the format.")
+            upscale_factor = 1
+
+        # With presigned delivery the server returns a preview and the full result is downloaded from S3
+        resize_with_bleed_func = partial(
+            resize_with_bleed, preview_only=const.PRESIGNED_DELIVERY, remove_bg=remove_bg, upscale_factor=upscale_factor
+        )
         # Image is smaller than the format, add bleed to fill the format
-        resized_image, image_bytes = process_image_smaller_than_format(img_bytes, format_width_px, format_height_px, resize_with_bleed)
+        resized_image, image_bytes, s3_key = process_image_smaller_than_format(img_bytes, format_width_px, format_height_px, resize_with_bleed_func, upscale_factor)
     else:
+        if upscale_factor > 1:
+            st.info("Skipping the upscale: the image already covers the format.")
+        if remove_bg and resize_option == "Crop Image":
+            # Cropping happens locally, so the background is removed on its own beforehand
+            img_bytes = remove_background(img_bytes)[1]
+        resize_with_bleed_func = partial(resize_with_bleed, preview_only=const.PRESIGNED_DELIVERY, remove_bg=remove_bg)
         # Image is larger than the format, use the chosen resize option
-        resized_image, image_bytes = process_image_larger_than_format(img_bytes, format_width_px, format_height_px, resize_option, resize_with_bleed)
+        resized_image, image_bytes, s3_key = process_image_larger_than_format(img_bytes, format_width_px, format_height_px, resize_option, resize_with_bleed_func)
+
+    # Results are only served straight from S3 when the stored object is really tagged at 300 DPI
+    served_from_s3 = s3_key is not None and const.PRESIGNED_DELIVERY
+    if served_from_s3 and result_transport.object_dpi(const.RESULTS_BUCKET, s3_key) != (300, 300):
+        # The worker did not apply output_dpi, so fetch the full result and tag it here
+        image_bytes = result_transport.fetch_object(const.RESULTS_BUCKET, s3_key)
+        resized_image = Image.open(BytesIO(image_bytes))
+        served_from_s3 = False
 
     if resized_image:
-        # Set DPI to 300 before saving the image
-        resized_image = set_image_dpi(resized_image, dpi=(300, 300))
+        # Only re-encode when the result is not already tagged at 300 DPI
+        if not served_from_s3 and tuple(round(d) for d in resized_image.info.get('dpi', (0, 0))) != (300, 300):
+            # Set DPI to 300 before saving the image
+            resized_image = set_image_dpi(resized_image, dpi=(300, 300))
 
-        # Save the image to bytes with 300 DPI
-        img_byte_arr = io.BytesIO()
-        resized_image.save(img_byte_arr, format='PNG', dpi=(300, 300))
-        img_byte_arr.seek(0)
-        image_bytes = img_byte_arr.getvalue()
+            # Save the image to bytes with 300 DPI
+            img_byte_arr = io.BytesIO()
+            resized_image.save(img_byte_arr, format='PNG', dpi=(300, 300))
+            img_byte_arr.seek(0)
+            image_bytes = img_byte_arr.getvalue()
 
         st.success("Image processed successfully!")
         st.image(resized_image, caption="Processed Image", use_column_width=True)
-        st.download_button(
-            label="Download Processed Image",
-            data=image_bytes,
-            file_name="processed_image.png",
-            mime="image/png"
-        )
+        if served_from_s3:
+            ui.presigned_download_button("Download Processed Image", s3_key, "processed_image.png")
+        else:
+            ui.download_button("Download Processed Image", image_bytes, "processed_image.png", "image/png")
     else:
         st.error("Could not process the image.")
 
@@ -1,8 +1,9 @@
 # services/generate_flyer.py
 
 import streamlit as st
-from io import BytesIO
+import constants as const
 from utils.server_utils import generate_flyer_image
+import elements as ui
 
 def run():
     st.title("Flyer Generator")
@@ -21,21 +22,16 @@ def run():
                     # Combine the text and design instructions into one prompt
                     flyer_prompt = f"Design a flyer with the following text: '{flyer_text}'. Design instructions: {flyer_design}."
 
-                    flyer_image, s3_key = generate_flyer_image(flyer_prompt)
+                    # With presigned delivery only a preview comes back; the full flyer is downloaded from S3
+                    flyer_image, image_bytes, s3_key = generate_flyer_image(flyer_prompt, preview_only=const.PRESIGNED_DELIVERY)
 
-                    # Convert PIL image to bytes
-                    buffered = BytesIO()
-                    flyer_image.save(buffered, format="PNG")
-                    image_bytes = buffered.getvalue()
                     if flyer_image:
                         st.success("Flyer generated successfully!")
                         st.image(flyer_image, caption="Generated Flyer", use_column_width=True)
-                        st.download_button(
-                            label="Download Flyer",
-                            data=image_bytes,
-                            file_name=s3_key.split("/")[-1],
-                            mime="image/png"
-                        )
+                        if const.PRESIGNED_DELIVERY:
+                            ui.presigned_download_button("Download Flyer", s3_key, s3_key.split("/")[-1])
+                        else:
+                            ui.download_button("Download Flyer", image_bytes, s3_key.split("/")[-1], "image/png")
                     else:
                         st.error("Could not download the flyer image.")
                 except ValueError as e:
@@ -4,7 +4,7 @@ import io
 import streamlit as st
 import constants as const
 from io import BytesIO
-from utils.server_utils import generate_with_YourDesigner, modify_prompt
+from utils.server_utils import generate_with_YourDesigner, generate_variants_with_YourDesigner, modify_prompt_stream
 from utils.batch_processing_utils import process_csv_prompts
 import requests 
 
@@ -30,6 +30,8 @@ def run():
         st.session_state.seed = 0  # Store the seed
     if 'returned_prompt' not in st.session_state:
         st.session_state.returned_prompt = ""  # Store the prompt
+    if 'variants' not in st.session_state:
+        st.session_state.variants = []  # Store the generated variants
 
     def update_ratio(choice):
         st.session_state.selected_ratio = choice
@@ -114,9 +116,56 @@ def run():
         # Prompting user to generate YourDesigner
         YourDesigner_prompt = st.text_area("Enter your YourDesigner prompt here:", "Your YourDesigner content goes here.")
 
+        # Several variants are generated together and the user picks the one to keep working on
+        num_variants = st.slider("Number of variants", 1, const.MAX_VARIANTS, 1)
+
         # Check if the ratio and prompt are selected
         if st.session_state.selected_ratio and YourDesigner_prompt:
-            if st.button("Generate YourDesigner"):
+            generate_clicked = st.button("Generate YourDesigner")
+            if generate_clicked:
+                st.session_state.variants = []
+
+            if generate_clicked and num_variants > 1:
+                with st.spinner("Generating your variants..."):
+                    try:
+                        st.session_state.selected_ratio_api = const.aspect_ratio_mapping.get(st.session_state.selected_ratio)
+
+                        if not st.session_state.selected_ratio_api:
+                            st.error("Selected aspect ratio is not supported.")
+                            raise ValueError("Invalid aspect ratio.")
+
+                        st.session_state.variants = generate_variants_with_YourDesigner(
+                            YourDesigner_prompt,
+                            st.session_state.selected_ratio_api,
+                            st.session_state.selected_style,
+                            st.session_state.selected_palette,
+                            num_variants
+                        )
+                        st.session_state.YourDesigner_image = None
+                        st.session_state.modified_image = None  # Reset the modified image
+                    except ValueError as e:
+                        st.error(f"Error: {str(e)}")
+
+            # Display the variants with their downloads and let the user pick one to modify
+            if st.session_state.variants:
+                columns = st.columns(2)
+                for index, variant in enumerate(st.session_state.variants):
+                    with columns[index % 2]:
+                        st.image(variant['image_bytes'], caption=f"Variant {index + 1} - Seed: {variant['seed']}", use_column_width=True)
+                        st.download_button(
+                            label="Download",
+                            data=variant['image_bytes'],
+                            file_name=f"YourDesigner_variant_{index + 1}.png",
+                            mime="image/png",
+                            key=f"download_variant_{index}"
+                        )
+                        if st.button("Use this variant", key=f"use_variant_{index}"):
+                            st.session_state.YourDesigner_image = variant['image']
+                            st.session_state.seed = variant['seed']
+                            st.session_state.returned_prompt = variant['prompt']
+                            st.session_state.modified_image = None
+
+            if generate_clicked and num_variants == 1:
                 with st.spinner("Generating your YourDesigner..."):
                     try:
                         st.session_state.selected_ratio_api = const.aspect_ratio_mapping.get(st.session_state.selected_ratio)
@@ -171,7 +220,8 @@ def run():
                 if st.button("Modify Image"):
                     with st.spinner("Modifying your image..."):
                         try:
-                            modification_prompt = modify_prompt(st.session_state.returned_prompt, modification_prompt)
+                            # Show the rewritten prompt as it is written; generation starts once it is complete
+                            modification_prompt = st.write_stream(modify_prompt_stream(st.session_state.returned_prompt, modification_prompt))
 
                             # Modify the original image based on the user's input
                             st.session_state.YourDesigner_image, new_seed, returned_prompt = generate_with_YourDesigner(
@@ -269,6 +319,10 @@ def run():
         # Update selected palette in session state
         st.session_state.selected_palette = palette_choice
 
+        # Variants generated for every prompt of the CSV
+        batch_num_variants = st.slider("Number of variants per prompt", 1, const.MAX_VARIANTS, 1, key='batch_num_variants')
+        batch_fresh = st.checkbox("Start fresh", key='batch_fresh_csv', help="Generate every row again instead of resuming an interrupted run of the same file and settings.")
+
         if uploaded_csv is not None:
             # Check if the ratio is selected
             if st.session_state.selected_ratio:
@@ -281,7 +335,9 @@ def run():
                             st.session_state.selected_style,
                             st.session_state.selected_palette,
                             st.session_state["name"],
-                            "Generate With Yourdesigner"
+                            "Generate With Yourdesigner",
+                            batch_num_variants,
+                            fresh=batch_fresh
                         )
                         st.download_button(
                                     label="Download ZIP File",
@@ -2,7 +2,7 @@ import zipfile
 import streamlit as st
 import constants as const
 from io import BytesIO
-from utils.server_utils import reimagine_image, generate_with_YourDesigner, modify_prompt
+from utils.server_utils import reimagine_image, generate_with_YourDesigner, modify_prompt, modify_prompt_stream, modify_prompts_bulk
 from utils.batch_processing_utils import process_zip_images  # Import the new function
 import pandas as pd
 
@@ -160,8 +160,8 @@ def run():
                 if st.button("Modify Image"):
                     with st.spinner("Modifying your image..."):
                         try:
-                            # Modify the original prompt with the user's input
-                            modification_prompt = modify_prompt(st.session_state.returned_prompt, modification_prompt)
+                            # Modify the original prompt with the user's input, showing it as it is written
+                            modification_prompt = st.write_stream(modify_prompt_stream(st.session_state.returned_prompt, modification_prompt))
 
                             # Regenerate the image with the modified prompt
                             st.session_state.YourDesigner_image, new_seed, returned_prompt = generate_with_YourDesigner(
@@ -251,6 +251,7 @@ def run():
             st.markdown(swatch_html, unsafe_allow_html=True)
 
             if uploaded_zip is not None:
+                batch_fresh = st.checkbox("Start fresh", key='batch_fresh_zip', help="Reimagine every image again instead of resuming an interrupted run of the same file and settings.")
                 # Check if the ratio is selected
                 if st.session_state.selected_ratio:
                     if st.button("Process ZIP"):
@@ -263,7 +264,8 @@ def run():
                                     st.session_state.selected_style,
                                     st.session_state.selected_palette,
                                     st.session_state.get("name", ""),
-                                    "Reimagine With Modification"
+                                    "Reimagine With Modification",
+                                    fresh=batch_fresh
                                 )
                                 if images_and_mapping is not None:
                                     # Store images and mapping in session state
@@ -299,6 +301,11 @@ def display_image_gallery():
         images = st.session_state['batch_images']
         mapping = st.session_state['mapping']
 
+        with st.expander("Modify All Images"):
+            bulk_modification = st.text_area("Modification Prompt", key="bulk_mod_prompt")
+            if st.button("Apply to All", key="apply_bulk_mod") and bulk_modification:
+                apply_modification_to_all(bulk_modification)
+
         st.subheader("Image Gallery (Click on an image to modify)")
 
         # Determine the number of columns (adjust as needed)
@@ -354,6 +361,45 @@ def open_image_dialog(img_name):
                     except Exception as e:
                         st.error(f"Error: {str(e)}")
 
+def apply_modification_to_all(modification_prompt):
+        images = st.session_state['batch_images']
+        mapping = st.session_state['mapping']
+        img_names = list(images)
+        selected_ratio_api = const.aspect_ratio_mapping.get(st.session_state.selected_ratio)
+
+        with st.spinner("Modifying prompts..."):
+            try:
+                # One bulk rewrite instead of a chat request per image
+                new_prompts = modify_prompts_bulk(
+                    [(mapping[img_name]['prompt'], modification_prompt) for img_name in img_names]
+                )
+            except Exception as e:
+                st.error(f"Error modifying prompts: {str(e)}")
+                return
+        if len(new_prompts) != len(img_names):
+            st.error(f"Expected {len(img_names)} modified prompts but got {len(new_prompts)}.")
+            return
+
+        progress_bar = st.progress(0)
+        for idx, (img_name, new_prompt) in enumerate(zip(img_names, new_prompts)):
+            try:
+                # Regenerate the image with its original seed
+                modified_image, new_seed, returned_prompt = generate_with_YourDesigner(
+                    new_prompt,
+                    selected_ratio_api,
+                    st.session_state.selected_style,
+                    st.session_state.selected_palette,
+                    seed=mapping[img_name]['seed']
+                )
+                images[img_name] = modified_image
+                mapping[img_name]['seed'] = new_seed
+                mapping[img_name]['prompt'] = returned_prompt
+            except Exception as e:
+                st.error(f"Error modifying {img_name}: {str(e)}")
+            progress_bar.progress((idx + 1) / len(img_names))
+
+        st.rerun()
+
 def create_zip_from_session():
         images = st.session_state['batch_images']
         mapping = st.session_state['mapping']
@@ -3,7 +3,6 @@
 import streamlit as st
 import constants as const
 from utils.server_utils import remix_image
-import requests
 
 def run():
     # Initialize session state variables
@@ -143,12 +142,13 @@ def run():
                         # Display and allow download for each remixed image
                         for index, image_data in enumerate(remixed_images):
                             st.write(f"Remixed Image {index + 1} - Resolution: {image_data['resolution']}")
-                            st.image(image_data['url'], caption=image_data['prompt'], use_column_width=True)
+                            # The image was already downloaded once, so display and download reuse its bytes
+                            st.image(image_data['image_bytes'], caption=image_data['prompt'], use_column_width=True)
                             
                             # Download button with a small download icon on top of the image
                             st.download_button(
                                 label="⬇️ Download",
-                                data=requests.get(image_data['url']).content,
+                                data=image_data['image_bytes'],
                                 file_name=f"remixed_image_{index + 1}.png",
                                 mime="image/png"
                             )
@@ -4,13 +4,27 @@ import streamlit as st
 from PIL import Image
 from io import BytesIO
 import base64
-from utils.server_utils import remove_background
+from utils.server_utils import remove_background, remove_background_batch
+from utils.batch_processing_utils import run_zip_gpu_batch
 import elements as ui
 
 def run():
     st.title("Background Remover")
     st.subheader("Upload an image, and the app will remove its background.")
 
+    # Add processing mode selection
+    processing_mode = st.radio("Select Processing Mode", ["Single Image", "Batch Processing via ZIP"])
+
+    if processing_mode == "Batch Processing via ZIP":
+        run_zip_gpu_batch(
+            remove_background_batch,
+            "bg_removed",
+            "Removing the backgrounds...",
+            "Backgrounds removed successfully!",
+            "Download ZIP with Backgrounds Removed"
+        )
+        return
+
     uploaded_file = st.sidebar.file_uploader("Choose an image...", ["jpg", "png", "jpeg"])
 
     if uploaded_file is not None:
@@ -20,10 +34,7 @@ def run():
         if st.sidebar.button("Process Image"):
             with st.spinner("Removing the background..."):
                 try:
-                    bg_removed_image, image_bytes = remove_background(img_bytes)
-                    buffered = BytesIO()
-                    bg_removed_image.save(buffered, format="PNG")
-                    image_bytes = buffered.getvalue()
+                    bg_removed_image, image_bytes, s3_key = remove_background(img_bytes)
                     # Create checkerboard background
                     width, height = bg_removed_image.size
                     checkerboard = ui.create_checkerboard(width, height)
@@ -33,11 +44,6 @@ def run():
 
                     st.success("Background removed successfully!")
                     st.image(checkerboard, caption="Background Removed Image", use_column_width=True)
-                    st.download_button(
-                        label="Download Image with Background Removed",
-                        data=image_bytes,
-                        file_name="bg_removed_image.png",
-                        mime="image/png"
-                    )
+                    ui.download_button("Download Image with Background Removed", image_bytes, "bg_removed_image.png", "image/png")
                 except ValueError as e:
                     st.error(f"Error: {str(e)}")
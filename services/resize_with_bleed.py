@@ -4,6 +4,15 @@ import streamlit as st
 import constants as const
 import image_calc_utils as img_utils
 
+def print_preparation():
+    # Optional server-side steps that run before the bleed is added
+    remove_bg = st.sidebar.checkbox("Remove background")
+    upscale_factor = st.sidebar.selectbox(
+        "Upscale small images before adding bleed", [1, 2, 4],
+        format_func=lambda factor: "No upscale" if factor == 1 else f"x{factor}"
+    )
+    return remove_bg, upscale_factor
+
 def run():
     # Get the uploaded file from session state or upload new
     uploaded_file = st.sidebar.file_uploader("Choose an image...", ["jpg", "png", "jpeg"])
@@ -25,10 +34,11 @@ def run():
 
             # Move resize_option here so it's chosen before processing
             resize_option = st.sidebar.radio("Image is larger than specified dimensions. Choose an option:", ["Scale Down and Fill Bleed", "Crop Image"])
+            remove_bg, upscale_factor = print_preparation()
 
             if st.sidebar.button("Process Image"):
                 with st.spinner("Processing your image..."):
-                    img_utils.process_and_display_image(img_bytes, base_width_mm, base_height_mm, resize_option)
+                    img_utils.process_and_display_image(img_bytes, base_width_mm, base_height_mm, resize_option, remove_bg, upscale_factor)
 
     elif resize_type == "Standard Resize":
         st.title("Standard Image Resize")
@@ -67,6 +77,8 @@ def run():
             st.sidebar.info(f"Base dimensions: {int(initial_width_mm)} mm x {int(initial_height_mm)} mm")
             st.sidebar.info(f"Final dimensions with Bleed mm: {format_width_mm} mm x {format_height_mm} mm")
 
+            remove_bg, upscale_factor = print_preparation()
+
             if st.sidebar.button("Process Image"):
                 with st.spinner("Processing your image..."):
-                    img_utils.process_and_display_image(img_bytes, format_width_px, format_height_px, resize_option)
+                    img_utils.process_and_display_image(img_bytes, format_width_px, format_height_px, resize_option, remove_bg, upscale_factor)
@@ -2,8 +2,9 @@
 
 import streamlit as st
 import constants as const
-from io import BytesIO
-from utils.server_utils import upscale_image
+from utils.server_utils import upscale_image, upscale_image_batch
+from utils.batch_processing_utils import run_zip_gpu_batch
+import elements as ui
 
 def run():
     st.sidebar.info("Use the slider to select how much you want to upscale your image.")
@@ -12,6 +13,19 @@ def run():
     st.title("Image Upscaler")
     st.subheader("Upload an image and choose an upscale factor. The app will enhance your image and provide a download link.")
 
+    # Add processing mode selection
+    processing_mode = st.radio("Select Processing Mode", ["Single Image", "Batch Processing via ZIP"])
+
+    if processing_mode == "Batch Processing via ZIP":
+        run_zip_gpu_batch(
+            lambda images: upscale_image_batch(images, upscale_factor),
+            "upscaled",
+            "Upscaling your images...",
+            "Images upscaled successfully!",
+            "Download ZIP of Upscaled Images"
+        )
+        return
+
     uploaded_file = st.sidebar.file_uploader("Choose an image...", ["jpg", "png", "jpeg"])
 
     if uploaded_file is not None:
@@ -21,21 +35,18 @@ def run():
         if st.sidebar.button("Process Image"):
             with st.spinner("Upscaling your image..."):
                 try:
-                    upscaled_image, s3_key = upscale_image(const.UPSCALE_SERVICE_URL, img_bytes, upscale_factor)
+                    # With presigned delivery only a preview comes back; the full image is downloaded from S3
+                    upscaled_image, image_bytes, s3_key = upscale_image(
+                        const.UPSCALE_SERVICE_URL, img_bytes, upscale_factor, preview_only=const.PRESIGNED_DELIVERY
+                    )
 
-                    # Convert PIL image to bytes
-                    buffered = BytesIO()
-                    upscaled_image.save(buffered, format="PNG")
-                    image_bytes = buffered.getvalue()
                     if upscaled_image:
                         st.success("Image upscaled successfully!")
                         st.image(upscaled_image, caption="Upscaled Image", use_column_width=True)
-                        st.download_button(
-                            label="Download Upscaled Image",
-                            data=image_bytes,
-                            file_name=s3_key.split("/")[-1],
-                            mime="image/png"
-                        )
+                        if const.PRESIGNED_DELIVERY:
+                            ui.presigned_download_button("Download Upscaled Image", s3_key, s3_key.split("/")[-1])
+                        else:
+                            ui.download_button("Download Upscaled Image", image_bytes, s3_key.split("/")[-1], "image/png")
                     else:
                         st.error("Could not download the image.")
                 except ValueError as e:
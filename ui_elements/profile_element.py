@@ -4,9 +4,9 @@ import os
 import base64
 from PIL import Image
 from io import BytesIO
-import boto3
 from datetime import datetime
 from utils.auth_utils import save_credentials
+from utils.clients import get_s3_client
 
 class ProfileUI:
     def __init__(self, username):
@@ -61,14 +61,8 @@ class ProfileUI:
             self.edit_profile()
 
     def create_s3_client(self):
-        # Create an S3 client
-        session = boto3.Session(
-            aws_access_key_id=st.secrets["AWS_ACCESS_KEY_ID"],
-            aws_secret_access_key=st.secrets["AWS_SECRET_ACCESS_KEY"],
-            region_name=st.secrets.get("aws_region", "us-east-1")
-        )
-        s3_client = session.client('s3')
-        return s3_client
+        # Reuse the process-wide S3 client instead of building one on every rerun
+        return get_s3_client()
     
     @st.dialog("Your History")
     def view_history(self):
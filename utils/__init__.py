@@ -2,5 +2,22 @@
 from . import (
     auth_utils,
     batch_processing_utils,
-    server_utils
+    server_utils,
+    runpod_client,
+    result_transport,
+    result_cache,
+    tiled_upscale,
+    input_staging,
+    clients,
+    s3_transfer,
+    endpoint_router,
+    keep_warm,
+    gpu_batch,
+    ideogram_client,
+    rate_limiter,
+    generation_cache,
+    description_cache,
+    vision_preprocess,
+    batch_executor,
+    batch_jobs
 )
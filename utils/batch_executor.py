@@ -0,0 +1,96 @@
+# utils/batch_executor.py
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import constants as const
+
+# Marks the end of a pipeline queue
+_DONE = object()
+
+
+def run(fn, items, max_workers=const.BATCH_WORKERS):
+    """
+    Call fn on every item with a bounded pool of worker threads and yield (index, result) as calls finish,
+    where result is fn's return value or the exception it raised.
+    Workers must not call Streamlit; the caller reports results and errors from the main thread.
+    Provider rate limits are applied inside the clients, so the pool only bounds how many calls wait at once.
+    """
+    if not items:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix="batch") as executor:
+        futures = {executor.submit(fn, item): index for index, item in enumerate(items)}
+        try:
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    yield futures[future], e
+        finally:
+            # Drop queued rows if the caller stops early
+            for future in futures:
+                future.cancel()
+
+
+def pipeline(items, stages, queue_size=const.PIPELINE_QUEUE_SIZE):
+    """
+    Stream items through a chain of stages, each a (fn, workers) pair with its own thread pool, linked by
+    bounded queues so a slow stage holds back the ones before it instead of piling up work.
+    Yields (index, result) as items leave the last stage; an exception raised by any stage skips the
+    remaining stages and is yielded as the result. Stage functions must not call Streamlit.
+    """
+    if not items:
+        return
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages] + [queue.Queue()]
+    stop = threading.Event()
+    threads = []
+
+    def feed():
+        for index, item in enumerate(items):
+            if stop.is_set():
+                break
+            queues[0].put((index, item))
+        for _ in range(stages[0][1]):
+            queues[0].put(_DONE)
+
+    def work(stage, fn, remaining):
+        inbox, outbox = queues[stage], queues[stage + 1]
+        while True:
+            entry = inbox.get()
+            if entry is _DONE:
+                break
+            index, value = entry
+            # Failed items and items left over after the caller stopped go straight to the end
+            if not isinstance(value, Exception) and not stop.is_set():
+                try:
+                    value = fn(value)
+                except Exception as e:
+                    value = e
+            outbox.put((index, value))
+        # The last worker of a stage to finish closes the next queue
+        with remaining["lock"]:
+            remaining["count"] -= 1
+            if remaining["count"] == 0:
+                for _ in range(stages[stage + 1][1] if stage + 1 < len(stages) else 1):
+                    outbox.put(_DONE)
+
+    threads.append(threading.Thread(target=feed, name="pipeline-feed", daemon=True))
+    for stage, (fn, workers) in enumerate(stages):
+        remaining = {"count": workers, "lock": threading.Lock()}
+        for worker in range(workers):
+            threads.append(threading.Thread(
+                target=work, args=(stage, fn, remaining), name=f"pipeline-{stage}-{worker}", daemon=True
+            ))
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            entry = queues[-1].get()
+            if entry is _DONE:
+                break
+            yield entry
+    finally:
+        # Let the workers drain the queues without doing more work if the caller stops early
+        stop.set()
@@ -0,0 +1,168 @@
+# utils/batch_jobs.py
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+import constants as const
+from utils import s3_transfer
+from utils.clients import get_s3_client
+
+
+def job_id(kind, data, params):
+    """
+    ID shared by every run of the same upload with the same settings. Each run gets its own ID on top
+    of it from start().
+    """
+    digest = hashlib.sha256()
+    digest.update(kind.encode('utf-8'))
+    digest.update(hashlib.sha256(data).digest())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def _key(username, job, *parts):
+    return "/".join([const.BATCH_JOBS_S3_PREFIX, username or "anonymous", job, *parts])
+
+
+def _local_path(key):
+    return os.path.join(const.BATCH_JOBS_DIR, *key.split("/"))
+
+
+def _put(key, data):
+    if const.BATCH_JOBS_BACKEND == "s3":
+        s3_transfer.upload_bytes(data, const.RESULTS_BUCKET, key)
+        return
+    path = _local_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename so a crash never leaves a half-written file behind
+    with open(path + ".tmp", 'wb') as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+
+def _get(key):
+    if const.BATCH_JOBS_BACKEND == "s3":
+        return s3_transfer.download_object(const.RESULTS_BUCKET, key)
+    with open(_local_path(key), 'rb') as f:
+        return f.read()
+
+
+def _delete(prefix):
+    if const.BATCH_JOBS_BACKEND == "s3":
+        keys = _list(prefix)
+        # delete_objects takes at most 1000 keys per call
+        for start in range(0, len(keys), 1000):
+            get_s3_client().delete_objects(
+                Bucket=const.RESULTS_BUCKET,
+                Delete={"Objects": [{"Key": key} for key in keys[start:start + 1000]], "Quiet": True}
+            )
+        return
+    shutil.rmtree(_local_path(prefix), ignore_errors=True)
+
+
+def _list_jobs(username):
+    prefix = _key(username, "")
+    if const.BATCH_JOBS_BACKEND == "s3":
+        jobs = []
+        paginator = get_s3_client().get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=const.RESULTS_BUCKET, Prefix=prefix, Delimiter="/"):
+            jobs.extend(item['Prefix'][len(prefix):].strip("/") for item in page.get('CommonPrefixes', []))
+        return jobs
+    directory = _local_path(prefix)
+    return os.listdir(directory) if os.path.isdir(directory) else []
+
+
+def _created(username, job):
+    try:
+        return json.loads(_get(_key(username, job, "job.json")))["created"]
+    except Exception:
+        # A run that never wrote its marker counts as expired
+        return 0
+
+
+def start(username, base_id, fresh=False):
+    """
+    Pick the run of a job to work on and return (run ID, resumed).
+    A run is only kept in the store while it is unfinished, so an existing run of the same job was
+    interrupted or has failed rows and is resumed, unless `fresh` asks for new generations. Runs older
+    than BATCH_JOBS_TTL are deleted first.
+    """
+    now = time.time()
+    unfinished = []
+    for job in _list_jobs(username):
+        created = _created(username, job)
+        if now - created > const.BATCH_JOBS_TTL:
+            delete_job(username, job)
+        elif job.startswith(base_id + "-"):
+            unfinished.append((created, job))
+
+    if unfinished and not fresh:
+        return max(unfinished)[1], True
+    for _, job in unfinished:
+        delete_job(username, job)
+
+    job = f"{base_id}-{uuid.uuid4().hex[:8]}"
+    _put(_key(username, job, "job.json"), json.dumps({"created": now}).encode('utf-8'))
+    return job, False
+
+
+def delete_job(username, job):
+    """
+    Delete a run's manifest and outputs, once its results have been delivered.
+    """
+    _delete(_key(username, job))
+
+
+def _list(prefix):
+    if const.BATCH_JOBS_BACKEND == "s3":
+        keys = []
+        paginator = get_s3_client().get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=const.RESULTS_BUCKET, Prefix=prefix + "/"):
+            keys.extend(item['Key'] for item in page.get('Contents', []))
+        return keys
+    directory = _local_path(prefix)
+    if not os.path.isdir(directory):
+        return []
+    return [f"{prefix}/{name}" for name in os.listdir(directory) if not name.endswith(".tmp")]
+
+
+def completed_rows(username, job):
+    """
+    Return {row: record} for every row of a job whose manifest entry says it finished.
+    Failed rows are left out so a resumed run tries them again.
+    """
+    rows = {}
+    for key in _list(_key(username, job, "rows")):
+        record = json.loads(_get(key))
+        if record.get("status") == "done":
+            rows[record["row"]] = record
+    return rows
+
+
+def record_row(username, job, row, record):
+    """
+    Write the manifest entry of one row, e.g. {"status": "done", "seed": ..., "output_key": ...}.
+    """
+    record = {**record, "row": str(row)}
+    _put(_key(username, job, "rows", f"{hashlib.sha256(str(row).encode('utf-8')).hexdigest()[:16]}.json"),
+         json.dumps(record).encode('utf-8'))
+
+
+def save_output(username, job, name, data):
+    """
+    Store one finished output of a job and return the key to load it back with.
+    """
+    key = _key(username, job, "outputs", name)
+    _put(key, data)
+    return key
+
+
+def load_output(key):
+    """
+    Load an output stored by save_output.
+    """
+    return _get(key)
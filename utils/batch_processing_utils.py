@@ -9,22 +9,16 @@ import shutil
 import constants as const
 import streamlit as st
 from datetime import datetime
-import boto3
 from utils import server_utils
-from utils.server_utils import reimagine_image
-import time
+from utils import s3_transfer, batch_executor, batch_jobs
+from utils.clients import get_s3_client
+import uuid
 from io import BytesIO
 from PIL import Image
 
 def initialize_s3_client():
-    # Initialize the S3 client with your credentials
-    s3_client = boto3.client(
-        's3',
-        aws_access_key_id=st.secrets["AWS_ACCESS_KEY_ID"],
-        aws_secret_access_key=st.secrets["AWS_SECRET_ACCESS_KEY"],
-        region_name=st.secrets.get("AWS_REGION", "us-east-1")
-    )
-    return s3_client
+    # Reuse the process-wide S3 client
+    return get_s3_client()
 
 def upload_to_s3(file_path, bucket_name, s3_path, object_name=None, s3_client=None):
     if s3_client is None:
@@ -37,14 +31,54 @@ def upload_to_s3(file_path, bucket_name, s3_path, object_name=None, s3_client=No
     s3_object_path = os.path.join(s3_path, object_name)
     
     try:
-        s3_client.upload_file(file_path, bucket_name, s3_object_path)
+        # Large files go up as a concurrent multipart upload
+        s3_client.upload_file(file_path, bucket_name, s3_object_path, Config=s3_transfer.transfer_config())
         url = f"https://{bucket_name}.s3.amazonaws.com/{s3_object_path}"
         return url
     except Exception as e:
         st.error(f"Error uploading to S3: {e}")
         return None
 
-def process_csv_prompts(uploaded_csv, ratio_label, style, palette, username, generation_type):
+def checkpoint(write):
+    """
+    Run a job store write from a worker thread. A failed write is logged and returns None, so the batch
+    carries on and the item is simply not resumable.
+    """
+    try:
+        return write()
+    except Exception as e:
+        print(f"Failed to checkpoint batch job: {e}")
+        return None
+
+def start_job(username, base_id, total, fresh):
+    """
+    Start or resume a run of a batch job and return (run ID, finished rows), telling the user when
+    an interrupted run is resumed.
+    """
+    try:
+        job, resumed = batch_jobs.start(username, base_id, fresh)
+        done_rows = batch_jobs.completed_rows(username, job) if resumed else {}
+    except Exception as e:
+        st.warning(f"Could not read earlier runs of batch job {base_id}, starting it from scratch: {str(e)}")
+        return f"{base_id}-{uuid.uuid4().hex[:8]}", {}
+    if resumed:
+        st.info(
+            f"Resuming interrupted batch job {job}: {len(done_rows)} of {total} items are already done. "
+            "Tick 'Start fresh' to generate everything again."
+        )
+    else:
+        st.caption(f"Batch job ID: {job}")
+    return job, done_rows
+
+def finish_job(username, job, failed):
+    """
+    Delete a run from the job store once its results are delivered. Runs with failed items are kept
+    so running the batch again retries only those.
+    """
+    if not failed:
+        checkpoint(lambda: batch_jobs.delete_job(username, job))
+
+def process_csv_prompts(uploaded_csv, ratio_label, style, palette, username, generation_type, num_variants=1, fresh=False):
     # Read the CSV file
     try:
         df = pd.read_csv(uploaded_csv)
@@ -74,46 +108,97 @@ def process_csv_prompts(uploaded_csv, ratio_label, style, palette, username, gen
 
     # Create a temporary directory to store images and mapping CSV
     temp_dir = tempfile.mkdtemp()
-    images = []
-    mapping = []
 
+    rows = []
     for index, row in df.iterrows():
         prompt = row['prompt']
         if not prompt:
             st.error(f"Row {index}: Missing prompt. Skipping.")
             continue
+        rows.append((index, prompt))
+
+    # Rerunning the same CSV with the same settings after an interruption reuses the finished rows
+    base_id = batch_jobs.job_id(
+        generation_type,
+        uploaded_csv.getvalue(),
+        {'ratio': ratio_label, 'style': style, 'palette': palette, 'num_variants': num_variants, 'username': username}
+    )
+    job, done_rows = start_job(username, base_id, len(rows), fresh)
 
-        # Call generate_with_YourDesigner function
+    def generate_row(row):
+        # Runs on a worker thread, so it only talks to the APIs and the job store; results are written below
+        index, prompt = row
+        record = done_rows.get(str(index))
+        if record is not None:
+            try:
+                return record, [batch_jobs.load_output(variant['output_key']) for variant in record['variants']]
+            except Exception as e:
+                print(f"Could not load the stored outputs of row {index}, generating it again: {e}")
+
+        # Generate all variants of the row in as few calls as possible
         try:
-            image, seed, returned_prompt = server_utils.generate_with_YourDesigner(
+            variants = server_utils.generate_variants_with_YourDesigner(
                 prompt,
                 ratio_api,
                 style,
-                palette
+                palette,
+                num_variants
             )
-            # Save image to temporary directory
-            image_name = f"image_{index}.png"
-            image_path = os.path.join(temp_dir, image_name)
-            image.save(image_path)
-            images.append(image_path)
-            # Add to mapping
-            mapping.append({
-                'original_index': index,
-                'prompt': prompt,
-                'generated_image': image_name,
-                'seed': seed,
-                'returned_prompt': returned_prompt,
-                'ratio': ratio_label,
-                'style': style,
-                'palette': palette
-            })
         except Exception as e:
-            st.error(f"Error processing row {index}: {str(e)}")
-            mapping.append({
+            checkpoint(lambda: batch_jobs.record_row(username, job, index, {'status': 'failed', 'error': str(e)}))
+            raise
+
+        record = {'status': 'done', 'prompt': prompt, 'variants': []}
+        for variant_index, variant in enumerate(variants):
+            image_name = f"image_{index}.png" if num_variants == 1 else f"image_{index}_{variant_index + 1}.png"
+            record['variants'].append({
+                'image_name': image_name,
+                'seed': variant['seed'],
+                'returned_prompt': variant['prompt'],
+                # Store every output as soon as it exists so a crash does not lose it
+                'output_key': checkpoint(lambda: batch_jobs.save_output(username, job, image_name, variant['image_bytes']))
+            })
+        if all(variant['output_key'] for variant in record['variants']):
+            checkpoint(lambda: batch_jobs.record_row(username, job, index, record))
+        return record, [variant['image_bytes'] for variant in variants]
+
+    # Rows finish out of order; keep their mapping entries by position to write them in CSV order
+    row_mappings = [None] * len(rows)
+    progress_bar = st.progress(0.0)
+
+    for done, (position, result) in enumerate(batch_executor.run(generate_row, rows), start=1):
+        index, prompt = rows[position]
+        if isinstance(result, Exception):
+            st.error(f"Error processing row {index}: {str(result)}")
+            row_mappings[position] = [{
                 'original_index': index,
                 'prompt': prompt,
-                'error': str(e)
-            })
+                'error': str(result)
+            }]
+        else:
+            record, image_bytes = result
+            row_mappings[position] = []
+            for variant, variant_bytes in zip(record['variants'], image_bytes):
+                # Save the downloaded bytes as they are to the temporary directory
+                image_path = os.path.join(temp_dir, variant['image_name'])
+                with open(image_path, 'wb') as f:
+                    f.write(variant_bytes)
+                # Add to mapping
+                row_mappings[position].append({
+                    'original_index': index,
+                    'prompt': prompt,
+                    'generated_image': variant['image_name'],
+                    'seed': variant['seed'],
+                    'returned_prompt': variant['returned_prompt'],
+                    'ratio': ratio_label,
+                    'style': style,
+                    'palette': palette
+                })
+        progress_bar.progress(done / len(rows))
+
+    mapping = [entry for entries in row_mappings for entry in entries]
+    # Zip the images in row order as well
+    images = [os.path.join(temp_dir, entry['generated_image']) for entry in mapping if 'generated_image' in entry]
 
   # Create mapping CSV in the temporary directory
     mapping_df = pd.DataFrame(mapping)
@@ -149,6 +234,9 @@ def process_csv_prompts(uploaded_csv, ratio_label, style, palette, username, gen
     # Clean up temporary directory
     shutil.rmtree(temp_dir)
 
+    # The ZIP is delivered, so the run's stored outputs are no longer needed
+    finish_job(username, job, any('error' in entry for entry in mapping))
+
     # Return both S3 URL and the in-memory zip buffer for downloading
     history_entry = {
         'timestamp': timestamp,
@@ -166,39 +254,73 @@ import zipfile
 import io
 import os
 from PIL import Image
-from utils.server_utils import reimagine_image
 import constants as const
 import pandas as pd
-import time
 import streamlit as st
-def process_zip_images(uploaded_zip, selected_ratio, selected_style, selected_palette, username, processing_type):
+def zip_image_names(zip_file):
+    # Filter out unwanted files
+    return [
+        f for f in zip_file.namelist()
+        if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp'))
+        and not os.path.basename(f).startswith('._')  # Ignore files starting with ._
+        and '__MACOSX' not in f  # Ignore files inside __MACOSX directory
+        and not f.endswith('/')  # Ignore directories
+    ]
+
+def process_zip_images(uploaded_zip, selected_ratio, selected_style, selected_palette, username, processing_type, fresh=False):
     try:
         # Read the uploaded zip file
         zip_file = zipfile.ZipFile(uploaded_zip)
-        # Filter out unwanted files
-        image_files = [
-            f for f in zip_file.namelist()
-            if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp'))
-            and not os.path.basename(f).startswith('._')  # Ignore files starting with ._
-            and '__MACOSX' not in f  # Ignore files inside __MACOSX directory
-            and not f.endswith('/')  # Ignore directories
-        ]
+        image_files = zip_image_names(zip_file)
 
         if not image_files:
             st.error("No supported image files found in the ZIP archive.")
             return None
 
-        images_dict = {}
-        mapping_dict = {}
+        # Get the API aspect ratio
+        selected_ratio_api = const.aspect_ratio_mapping.get(selected_ratio)
+        if not selected_ratio_api:
+            st.error(f"Selected aspect ratio '{selected_ratio}' is not supported.")
+            return None
 
-        for img_name in image_files:
+        # Rerunning the same ZIP with the same settings after an interruption reuses the finished images
+        base_id = batch_jobs.job_id(
+            processing_type,
+            uploaded_zip.getvalue(),
+            {'ratio': selected_ratio, 'style': selected_style, 'palette': selected_palette, 'username': username}
+        )
+        job, done_rows = start_job(username, base_id, len(image_files), fresh)
+
+        results = [None] * len(image_files)
+        progress_bar = st.progress(0.0)
+        done = 0
+
+        def load(position):
+            record = done_rows[image_files[position]]
+            image = Image.open(BytesIO(batch_jobs.load_output(record['output_key'])))
+            return image, record['seed'], record['prompt']
+
+        pending = []
+        resumed = [position for position, img_name in enumerate(image_files) if img_name in done_rows]
+        for resumed_index, result in batch_executor.run(load, resumed):
+            position = resumed[resumed_index]
+            if isinstance(result, Exception):
+                # The stored output is gone, so reimagine the image again
+                pending.append(position)
+                continue
+            results[position] = result
+            done += 1
+            progress_bar.progress(done / len(image_files))
+        pending.extend(position for position, img_name in enumerate(image_files) if img_name not in done_rows)
+
+        # Every stage passes the image's position along with its data
+        def prepare(position):
             # Read image data
-            img_data = zip_file.read(img_name)
+            img_data = zip_file.read(image_files[position])
             # Check image size
             if len(img_data) > 20 * 1024 * 1024:
                 # Image is larger than 20 MB
-                st.warning(f"Skipping image '{img_name}' because it exceeds 20 MB size limit.")
-                continue
+                raise ValueError("it exceeds 20 MB size limit")
 
             # Open the image using PIL
             try:
@@ -207,31 +329,67 @@ def process_zip_images(uploaded_zip, selected_ratio, selected_style, selected_pa
                 if image.mode != 'RGB':
                     image = image.convert('RGB')
             except Exception as e:
-                st.warning(f"Skipping image '{img_name}' because it could not be opened: {str(e)}")
-                continue
+                raise ValueError(f"it could not be opened: {str(e)}")
 
             # Save image to bytes in a supported format (JPEG)
             img_byte_arr = io.BytesIO()
             image.save(img_byte_arr, format='JPEG')
-            img_bytes = img_byte_arr.getvalue()
+            return position, img_byte_arr.getvalue()
 
-            # Get the API aspect ratio
-            selected_ratio_api = const.aspect_ratio_mapping.get(selected_ratio)
-            if not selected_ratio_api:
-                st.error(f"Selected aspect ratio '{selected_ratio}' is not supported.")
-                return None
+        def describe(item):
+            position, img_bytes = item
+            return position, server_utils.describe_for_diffusion(img_bytes)
 
-            # Call reimagine_image function
-            reimagined_image, seed, returned_prompt = reimagine_image(
-                img_bytes,
+        def generate(item):
+            position, refined_prompt = item
+            return position, server_utils.generate_with_YourDesigner(
+                refined_prompt,
                 selected_ratio_api,
                 selected_style,
                 selected_palette
             )
 
-            if reimagined_image is None:
-                st.warning(f"Failed to reimagine image '{img_name}'. Skipping.")
+        def store(item):
+            # Store the output and its manifest entry as soon as the image is done
+            position, (reimagined_image, seed, returned_prompt) = item
+            img_byte_arr = io.BytesIO()
+            reimagined_image.save(img_byte_arr, format='PNG')
+            output_key = checkpoint(lambda: batch_jobs.save_output(
+                username, job, f"{position}_{os.path.basename(image_files[position])}.png", img_byte_arr.getvalue()
+            ))
+            if output_key:
+                checkpoint(lambda: batch_jobs.record_row(username, job, image_files[position], {
+                    'status': 'done', 'seed': seed, 'prompt': returned_prompt, 'output_key': output_key
+                }))
+            return reimagined_image, seed, returned_prompt
+
+        # Each image is described by GPT-4o while earlier ones are generating on Ideogram
+        stages = [
+            (prepare, const.REIMAGINE_PREPARE_WORKERS),
+            (describe, const.REIMAGINE_DESCRIBE_WORKERS),
+            (generate, const.REIMAGINE_GENERATE_WORKERS),
+            (store, const.REIMAGINE_STORE_WORKERS)
+        ]
+        for pending_index, result in batch_executor.pipeline(pending, stages):
+            position = pending[pending_index]
+            if isinstance(result, Exception):
+                st.warning(f"Skipping image '{image_files[position]}' because {str(result)}")
+                checkpoint(lambda: batch_jobs.record_row(
+                    username, job, image_files[position], {'status': 'failed', 'error': str(result)}
+                ))
+            else:
+                results[position] = result
+            done += 1
+            progress_bar.progress(done / len(image_files))
+
+        images_dict = {}
+        mapping_dict = {}
+
+        # Collect the results in ZIP order
+        for img_name, result in zip(image_files, results):
+            if result is None:
                 continue
+            reimagined_image, seed, returned_prompt = result
 
             # Ensure unique filenames to avoid overwriting
             base_name = os.path.basename(img_name)
@@ -253,8 +411,8 @@ def process_zip_images(uploaded_zip, selected_ratio, selected_style, selected_pa
                 'processing_type': processing_type
             }
 
-            # Sleep to prevent rate limiting (adjust as needed)
-            time.sleep(1)
+        # The images now live in the session, so the run's stored outputs are no longer needed
+        finish_job(username, job, any(result is None for result in results))
 
         if not images_dict:
             st.error("No images were successfully reimagined.")
@@ -266,3 +424,58 @@ def process_zip_images(uploaded_zip, selected_ratio, selected_style, selected_pa
     except Exception as e:
         st.error(f"An error occurred during batch processing: {str(e)}")
         return None
+
+def process_zip_gpu(uploaded_zip, process_batch, output_prefix):
+    """
+    Run a batched GPU operation over every image in a ZIP and collect the results into a new ZIP.
+    process_batch takes a list of image bytes and yields (index, result) with result being
+    (image, image_bytes, object_key) or an exception.
+    Returns the ZIP buffer and a list of failure messages, or None if the ZIP has no images.
+    """
+    zip_file = zipfile.ZipFile(uploaded_zip)
+    image_files = zip_image_names(zip_file)
+    if not image_files:
+        st.error("No supported image files found in the ZIP archive.")
+        return None
+
+    images = [zip_file.read(img_name) for img_name in image_files]
+    progress_bar = st.progress(0.0)
+    failures = []
+
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as output_zip:
+        for done, (index, result) in enumerate(process_batch(images), start=1):
+            img_name = image_files[index]
+            if isinstance(result, Exception):
+                failures.append(f"{img_name}: {str(result)}")
+            else:
+                base_name = os.path.splitext(os.path.basename(img_name))[0]
+                output_zip.writestr(f"{output_prefix}_{base_name}.png", result[1])
+            progress_bar.progress(done / len(images))
+
+    zip_buffer.seek(0)
+    return zip_buffer, failures
+
+
+def run_zip_gpu_batch(process_batch, output_prefix, spinner_text, success_text, download_label):
+    """
+    Sidebar ZIP upload, processing and download for a batched GPU operation.
+    process_batch is passed on to process_zip_gpu; results are offered as {output_prefix}_images.zip.
+    """
+    uploaded_zip = st.sidebar.file_uploader("Choose a ZIP of images...", ["zip"])
+
+    if uploaded_zip is not None and st.sidebar.button("Process ZIP"):
+        with st.spinner(spinner_text):
+            result = process_zip_gpu(uploaded_zip, process_batch, output_prefix)
+
+        if result:
+            zip_buffer, failures = result
+            for failure in failures:
+                st.warning(f"Failed to process {failure}")
+            st.success(success_text)
+            st.download_button(
+                label=download_label,
+                data=zip_buffer,
+                file_name=f"{output_prefix}_images.zip",
+                mime="application/zip"
+            )
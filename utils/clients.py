@@ -0,0 +1,108 @@
+# utils/clients.py
+
+import os
+import threading
+
+import boto3
+import requests
+import streamlit as st
+from botocore.config import Config
+from openai import OpenAI
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import constants as const
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class _TimeoutSession(requests.Session):
+    # requests has no session-wide timeout, so apply the default to every call that does not set one
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", const.HTTP_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+
+def _aws_session_kwargs():
+    # Prefer the Streamlit secrets and fall back to boto3's default credential chain
+    try:
+        return {
+            "aws_access_key_id": st.secrets["AWS_ACCESS_KEY_ID"],
+            "aws_secret_access_key": st.secrets["AWS_SECRET_ACCESS_KEY"],
+            # Older deployments only set the lowercase key
+            "region_name": st.secrets.get("AWS_REGION") or st.secrets.get("aws_region") or "us-east-1",
+        }
+    except Exception:
+        return {}
+
+
+def get_s3_client():
+    """
+    Return the process-wide S3 client, created once with a connection pool sized for our concurrency.
+    """
+    with _clients_lock:
+        if "s3" not in _clients:
+            config = Config(
+                max_pool_connections=const.S3_MAX_POOL_CONNECTIONS,
+                connect_timeout=const.HTTP_TIMEOUT[0],
+                read_timeout=const.HTTP_TIMEOUT[1],
+                retries={"max_attempts": const.HTTP_MAX_RETRIES, "mode": "standard"},
+            )
+            session = boto3.session.Session(**_aws_session_kwargs())
+            _clients["s3"] = session.client('s3', config=config)
+        return _clients["s3"]
+
+
+def _pooled_session(max_retries):
+    adapter = HTTPAdapter(
+        pool_connections=const.HTTP_POOL_SIZE,
+        pool_maxsize=const.HTTP_POOL_SIZE,
+        max_retries=max_retries,
+    )
+    session = _TimeoutSession()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_http_session():
+    """
+    Return the process-wide requests session with keep-alive pooling, default timeouts and retries
+    for idempotent requests.
+    """
+    with _clients_lock:
+        if "http" not in _clients:
+            _clients["http"] = _pooled_session(Retry(
+                total=const.HTTP_MAX_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=[502, 503, 504],
+                allowed_methods=["GET", "HEAD"],
+            ))
+        return _clients["http"]
+
+
+def get_unretried_http_session():
+    """
+    Return a pooled session like get_http_session() but without transport-level retries, for clients
+    that run their own retry loop (the Ideogram client) so attempts are not multiplied.
+    """
+    with _clients_lock:
+        if "http-unretried" not in _clients:
+            _clients["http-unretried"] = _pooled_session(0)
+        return _clients["http-unretried"]
+
+
+def get_openai_client():
+    """
+    Return the process-wide OpenAI client so every call reuses its connection pool.
+    """
+    with _clients_lock:
+        if "openai" not in _clients:
+            _clients["openai"] = OpenAI(
+                api_key=os.environ.get("OPENAI_API_KEY"),
+                organization=const.OPENAI_ORGANIZATION,
+                timeout=const.HTTP_TIMEOUT[1],
+                max_retries=const.HTTP_MAX_RETRIES,
+            )
+        return _clients["openai"]
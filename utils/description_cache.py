@@ -0,0 +1,40 @@
+# utils/description_cache.py
+
+import hashlib
+import threading
+
+import constants as const
+from utils.result_cache import DiskLRUCache
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskLRUCache(const.DESCRIPTION_CACHE_DIR, const.DESCRIPTION_CACHE_MAX_BYTES)
+        return _cache
+
+
+def description_key(image_bytes, provider, prompt_template):
+    """
+    Hash the image content together with the provider and the prompt template that produced the description.
+    """
+    digest = hashlib.sha256()
+    for part in (provider.encode('utf-8'), prompt_template.encode('utf-8'), image_bytes):
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+
+def get(image_bytes, provider, prompt_template):
+    """
+    Return the cached description of an image, or None.
+    """
+    entry = _get_cache().get(description_key(image_bytes, provider, prompt_template))
+    return None if entry is None else entry[0].decode('utf-8')
+
+
+def put(image_bytes, provider, prompt_template, description):
+    _get_cache().put(description_key(image_bytes, provider, prompt_template), description.encode('utf-8'))
@@ -0,0 +1,135 @@
+# utils/endpoint_router.py
+
+import random
+import threading
+import time
+
+import constants as const
+
+_health = {}
+_submitted = {}
+_last_submitted = {}
+_state_lock = threading.Lock()
+_sampler = None
+
+
+def route_key(payload):
+    """
+    Return the routing table entry for a payload. Upscales are split by model so x2 jobs never queue behind x4 jobs.
+    """
+    payload_input = payload["input"]
+    operation = payload_input.get("type")
+    # Batched jobs go wherever their underlying operation goes
+    if operation == "batch":
+        operation = payload_input.get("operation")
+    if operation == "upscale":
+        model_name = payload_input.get("model_params", {}).get("upscaler_model_name", "")
+        return "upscale-x4" if "x4plus" in model_name else "upscale-x2"
+    return operation
+
+
+def routes_for(payload):
+    """
+    Return the {endpoint ID: weight} map for a payload, falling back to the default endpoint.
+    """
+    return const.RUNPOD_ROUTES.get(route_key(payload)) or {const.RUNPOD_ENDPOINT_ID: 1}
+
+
+def _sample_health():
+    # Imported here because the job client imports this module to pick endpoints
+    from utils.runpod_client import get_endpoint
+
+    while True:
+        endpoint_ids = {endpoint_id for routes in const.RUNPOD_ROUTES.values() for endpoint_id in routes}
+        for endpoint_id in endpoint_ids:
+            try:
+                health = get_endpoint(endpoint_id).health()
+            except Exception as e:
+                print(f"Failed to sample health of RunPod endpoint {endpoint_id}: {e}")
+                continue
+            jobs = health.get("jobs", {})
+            with _state_lock:
+                _health[endpoint_id] = {
+                    "depth": jobs.get("inQueue", 0) + jobs.get("inProgress", 0),
+                    "workers": health.get("workers", {}),
+                    "sampled_at": time.monotonic(),
+                }
+                # The new sample already includes everything we submitted before it
+                _submitted[endpoint_id] = 0
+        time.sleep(const.RUNPOD_HEALTH_INTERVAL)
+
+
+def _ensure_sampler():
+    global _sampler
+    with _state_lock:
+        if _sampler is None or not _sampler.is_alive():
+            _sampler = threading.Thread(target=_sample_health, name="runpod-health", daemon=True)
+            _sampler.start()
+
+
+def _recent_sample(endpoint_id):
+    # Callers hold _state_lock
+    sample = _health.get(endpoint_id)
+    if sample is None or time.monotonic() - sample["sampled_at"] > const.RUNPOD_HEALTH_MAX_AGE:
+        return None
+    return sample
+
+
+def queue_depth(endpoint_id):
+    """
+    Return the estimated queued plus running jobs on an endpoint, or None without a recent health sample.
+    """
+    with _state_lock:
+        sample = _recent_sample(endpoint_id)
+        if sample is None:
+            return None
+        # Count our own submissions since the sample so a burst does not pile onto one endpoint
+        return sample["depth"] + _submitted.get(endpoint_id, 0)
+
+
+def worker_counts(endpoint_id):
+    """
+    Return the worker counts (idle, running, initializing, ...) from the latest health sample, or None.
+    """
+    _ensure_sampler()
+    with _state_lock:
+        sample = _recent_sample(endpoint_id)
+        return None if sample is None else dict(sample["workers"])
+
+
+def rank_endpoints(payload):
+    """
+    Return the endpoint IDs that can serve a payload, best first.
+    Endpoints are ordered by queue depth relative to their weight; without health data the order is a weighted shuffle.
+    """
+    _ensure_sampler()
+    routes = routes_for(payload)
+
+    def score(endpoint_id):
+        weight = routes[endpoint_id]
+        depth = queue_depth(endpoint_id)
+        # Weighted random tie-breaker (Efraimidis-Spirakis) keeps equal endpoints evenly loaded
+        tie_breaker = -random.random() ** (1.0 / weight)
+        if depth is None:
+            return (0, tie_breaker)
+        return ((depth + 1) / weight, tie_breaker)
+
+    return sorted(routes, key=score)
+
+
+def note_submitted(endpoint_id):
+    """
+    Count a job submitted to an endpoint until the next health sample reflects it.
+    """
+    with _state_lock:
+        _submitted[endpoint_id] = _submitted.get(endpoint_id, 0) + 1
+        _last_submitted[endpoint_id] = time.monotonic()
+
+
+def seconds_since_submit(endpoint_id):
+    """
+    Return the seconds since this process last submitted a job to an endpoint, or None if it never did.
+    """
+    with _state_lock:
+        last = _last_submitted.get(endpoint_id)
+    return None if last is None else time.monotonic() - last
@@ -0,0 +1,52 @@
+# utils/generation_cache.py
+
+import hashlib
+import json
+import threading
+from io import BytesIO
+
+from PIL import Image
+
+import constants as const
+from utils.result_cache import DiskLRUCache
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskLRUCache(const.GENERATION_CACHE_DIR, const.GENERATION_CACHE_MAX_BYTES)
+        return _cache
+
+
+def request_key(image_request, endpoint="generate"):
+    """
+    Hash a normalized Ideogram request. Requests that differ only in key order or prompt whitespace share a key.
+    """
+    normalized = {k: v for k, v in image_request.items() if v is not None}
+    if isinstance(normalized.get("prompt"), str):
+        normalized["prompt"] = " ".join(normalized["prompt"].split())
+    payload = json.dumps({"endpoint": endpoint, "request": normalized}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get(image_request, endpoint="generate"):
+    """
+    Return (image, image_bytes, seed, prompt) for a request that was generated before, or None.
+    """
+    entry = _get_cache().get(request_key(image_request, endpoint))
+    if entry is None:
+        return None
+    image_bytes, meta = entry
+    return Image.open(BytesIO(image_bytes)), image_bytes, meta["seed"], meta["prompt"]
+
+
+def put(image_request, image_bytes, seed, prompt, endpoint="generate"):
+    """
+    Store a generated image under its request, with the seed filled in so a replay with that seed hits.
+    """
+    request = {**image_request, "seed": seed}
+    _get_cache().put(request_key(request, endpoint), image_bytes, {"seed": seed, "prompt": prompt})
@@ -0,0 +1,140 @@
+# utils/gpu_batch.py
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import constants as const
+from utils import runpod_client, input_staging
+
+_item_executor = ThreadPoolExecutor(max_workers=const.S3_TRANSFER_CONCURRENCY, thread_name_prefix="gpu-batch")
+
+
+def pack(sizes, max_bytes=const.GPU_BATCH_MAX_BYTES, max_items=const.GPU_BATCH_MAX_ITEMS):
+    """
+    Group item indices, in order, into batches bounded by total input bytes and item count.
+    An item larger than max_bytes gets a batch of its own.
+    """
+    batches = []
+    current = []
+    current_bytes = 0
+    for index, size in enumerate(sizes):
+        if current and (current_bytes + size > max_bytes or len(current) >= max_items):
+            batches.append(current)
+            current = []
+            current_bytes = 0
+        current.append(index)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _item(operation, image_bytes, file_name):
+    # Same input shape as a single job, minus the type that now lives on the batch
+    item = input_staging.image_payload(operation, image_bytes, {"aws_save_name": file_name})["input"]
+    del item["type"]
+    return item
+
+
+def batch_payload(operation, images, file_names, model_params):
+    """
+    Build one RunPod payload that runs an operation over several images.
+    model_params are shared by every item; each item carries its own input and save name.
+    """
+    items = list(_item_executor.map(lambda args: _item(operation, *args), zip(images, file_names)))
+    return {
+        "input": {
+            "type": "batch",
+            "operation": operation,
+            "model_params": model_params,
+            "items": items
+        }
+    }
+
+
+def _iter_bounded(jobs):
+    """
+    Submit (key, submit) jobs with at most GPU_BATCH_MAX_IN_FLIGHT running and yield (key, future) as they finish.
+    Deadlines and TTLs start at submission, so the next job is only submitted once an earlier one completes.
+    """
+    jobs = iter(jobs)
+    pending = {}
+
+    def fill():
+        for key, submit in jobs:
+            try:
+                future = submit()
+            except Exception as e:
+                # A payload that cannot be built fails its own job only
+                future = Future()
+                future.set_exception(e)
+            pending[future] = key
+            if len(pending) >= const.GPU_BATCH_MAX_IN_FLIGHT:
+                break
+
+    try:
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+            fill()
+    finally:
+        # Free the GPU capacity held by jobs nobody will read
+        for future in pending:
+            future.cancel()
+
+
+def _iter_single_outputs(operation, images, file_names, model_params):
+    def submit(index):
+        payload = input_staging.image_payload(
+            operation, images[index], {**model_params, "aws_save_name": file_names[index]}
+        )
+        return runpod_client.submit(payload)
+
+    jobs = ((index, lambda index=index: submit(index)) for index in range(len(images)))
+    for index, future in _iter_bounded(jobs):
+        try:
+            yield index, future.result()
+        except Exception as e:
+            yield index, e
+
+
+def iter_outputs(operation, images, file_names, model_params):
+    """
+    Submit the images as batched jobs and yield (index, output) as batches finish, where output is the
+    worker's per-item output dict or the exception that prevented it.
+    Without GPU_BATCH_ENABLED every image goes out as an ordinary single-image job instead.
+    At most GPU_BATCH_MAX_IN_FLIGHT jobs are submitted at any time.
+    """
+    if not const.GPU_BATCH_ENABLED:
+        yield from _iter_single_outputs(operation, images, file_names, model_params)
+        return
+
+    def submit(batch):
+        payload = batch_payload(
+            operation,
+            [images[index] for index in batch],
+            [file_names[index] for index in batch],
+            model_params
+        )
+        # A batch runs its items one after another on the worker, so its deadline grows with its size
+        deadline = runpod_client.deadline_for(operation) + const.GPU_BATCH_ITEM_SECONDS * len(batch)
+        return runpod_client.submit(payload, deadline=deadline)
+
+    batches = pack([len(image_bytes) for image_bytes in images])
+    jobs = ((batch, lambda batch=batch: submit(batch)) for batch in batches)
+    for batch, future in _iter_bounded(jobs):
+        try:
+            outputs = future.result().get("results", [])
+            if len(outputs) != len(batch):
+                raise ValueError(f"Batch output has {len(outputs)} results for {len(batch)} images")
+        except Exception as e:
+            for index in batch:
+                yield index, e
+            continue
+
+        for index, output in zip(batch, outputs):
+            if output.get("error"):
+                yield index, ValueError(output["error"])
+            else:
+                yield index, output
@@ -0,0 +1,184 @@
+# utils/ideogram_client.py
+
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+import streamlit as st
+
+import constants as const
+from utils import rate_limiter
+from utils.clients import get_unretried_http_session
+
+_download_executor = ThreadPoolExecutor(max_workers=const.IDEOGRAM_DOWNLOAD_WORKERS, thread_name_prefix="ideogram-download")
+_request_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ideogram-request")
+
+
+class IdeogramError(ValueError):
+    """
+    Raised when an Ideogram request fails for good, after any retries.
+    """
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _retry_after(response):
+    # Retry-After is either a number of seconds or an HTTP date
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt, response=None):
+    """
+    Seconds to wait before retry number `attempt` (starting at 0): the server's Retry-After when given,
+    otherwise exponential backoff with full jitter.
+    """
+    delay = _retry_after(response)
+    if delay is None:
+        delay = random.uniform(0, const.IDEOGRAM_BACKOFF_BASE * 2 ** attempt)
+    return min(max(delay, 0), const.IDEOGRAM_BACKOFF_MAX)
+
+
+def request(method, url, api_key=None, **kwargs):
+    """
+    Send a request on a pooled session without transport retries, retrying throttled (429), 5xx and
+    connection failures here.
+    Callers must make retried calls safe to replay; generation requests pin their seed for that.
+    """
+    headers = dict(kwargs.pop("headers", {}))
+    is_api_call = url.startswith(const.IDEOGRAM_API_URL)
+    if is_api_call:
+        headers["Api-Key"] = api_key or st.secrets["IDEOGRAM_API_KEY"]
+    kwargs.setdefault("timeout", const.IDEOGRAM_TIMEOUT)
+
+    for attempt in range(const.IDEOGRAM_MAX_ATTEMPTS):
+        last_attempt = attempt == const.IDEOGRAM_MAX_ATTEMPTS - 1
+        # Every attempt, retries included, draws from the budget shared by all sessions
+        if is_api_call:
+            rate_limiter.acquire("ideogram")
+        try:
+            response = get_unretried_http_session().request(method, url, headers=headers, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if last_attempt:
+                raise IdeogramError(f"Request to {url} failed: {e}")
+            time.sleep(_backoff(attempt))
+            continue
+
+        if response.status_code == 200:
+            return response
+        if response.status_code not in const.IDEOGRAM_RETRY_STATUSES or last_attempt:
+            raise IdeogramError(
+                f"API request failed with status code {response.status_code}: {response.text}",
+                response.status_code
+            )
+        time.sleep(_backoff(attempt, response))
+
+
+def pin_seed(image_request):
+    """
+    Give a single-image request an explicit seed so a retried generation returns the same image.
+    Requests for several images leave seeding to Ideogram so every variant differs.
+    """
+    if image_request.get("seed", -1) == -1:
+        if image_request.get("num_images", 1) == 1:
+            image_request["seed"] = random.randint(0, const.IDEOGRAM_MAX_SEED)
+        else:
+            image_request.pop("seed", None)
+    return image_request
+
+
+def generate(image_request):
+    """
+    Call /generate and return the list of generated image infos.
+    """
+    response = request(
+        "POST",
+        f"{const.IDEOGRAM_API_URL}/generate",
+        json={"image_request": pin_seed(image_request)}
+    )
+    return _image_data(response)
+
+
+def generate_variants(image_request, num_images):
+    """
+    Generate num_images images for one request, split into calls of at most IDEOGRAM_MAX_IMAGES_PER_REQUEST
+    that run in parallel. Returns all image infos in order.
+    """
+    chunk_sizes = []
+    remaining = num_images
+    while remaining > 0:
+        chunk_sizes.append(min(remaining, const.IDEOGRAM_MAX_IMAGES_PER_REQUEST))
+        remaining -= chunk_sizes[-1]
+
+    def generate_chunk(chunk_size):
+        return generate({**image_request, "num_images": chunk_size})
+
+    # A single call runs on the caller's thread, so concurrent batch rows are not capped by the shared pool
+    if len(chunk_sizes) == 1:
+        return generate_chunk(chunk_sizes[0])
+    return [image_info for chunk in _request_executor.map(generate_chunk, chunk_sizes) for image_info in chunk]
+
+
+def remix(image_request, image_bytes, api_key=None):
+    """
+    Call /remix with an input image and return the list of generated image infos.
+    """
+    # The image is sent from memory so every retry uploads the full file again
+    response = request(
+        "POST",
+        f"{const.IDEOGRAM_API_URL}/remix",
+        api_key=api_key,
+        data={"image_request": json.dumps(pin_seed(image_request))},
+        files={"image_file": ("image_file", image_bytes, "image/png")}
+    )
+    return _image_data(response)
+
+
+def describe(image_bytes):
+    """
+    Call /describe and return the raw list of descriptions.
+    """
+    response = request("POST", f"{const.IDEOGRAM_API_URL}/describe", files={"image_file": image_bytes})
+    return response.json().get("descriptions", [])
+
+
+def download(url):
+    """
+    Download a generated image and return its bytes.
+    """
+    try:
+        return request("GET", url).content
+    except IdeogramError:
+        raise IdeogramError(f"Failed to download image from {url}")
+
+
+def download_many(urls):
+    """
+    Download several generated images in parallel and return their bytes in the same order.
+    """
+    if len(urls) == 1:
+        return [download(urls[0])]
+    return list(_download_executor.map(download, urls))
+
+
+def _image_data(response):
+    response_json = response.json()
+    # Check if the response contains the 'data' field
+    if 'data' not in response_json or not response_json['data']:
+        raise IdeogramError("No image data found in the response.")
+    return response_json['data']
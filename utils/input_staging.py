@@ -0,0 +1,53 @@
+# utils/input_staging.py
+
+import base64
+import hashlib
+import threading
+
+from botocore.exceptions import ClientError
+
+import constants as const
+from utils import s3_transfer
+from utils.clients import get_s3_client
+
+_staged_keys = set()
+_staged_keys_lock = threading.Lock()
+
+
+def stage_input(image_bytes):
+    """
+    Upload an input image once under a content-addressed key and return the key.
+    The upload is skipped when this process already staged the image or the object already exists.
+    """
+    key = f"{const.INPUT_STAGING_PREFIX}/{hashlib.sha256(image_bytes).hexdigest()}"
+    with _staged_keys_lock:
+        if key in _staged_keys:
+            return key
+
+    s3_client = get_s3_client()
+    try:
+        s3_client.head_object(Bucket=const.INPUT_STAGING_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ["404", "NoSuchKey", "NotFound"]:
+            raise
+        # Stream straight from the bytes buffer instead of building another copy
+        s3_transfer.upload_bytes(image_bytes, const.INPUT_STAGING_BUCKET, key)
+
+    with _staged_keys_lock:
+        _staged_keys.add(key)
+    return key
+
+
+def image_payload(operation, image_bytes, model_params, input_mode=None):
+    """
+    Build a RunPod payload for an image operation.
+    In "s3" mode the image is staged and only its key travels in model_params; in "base64" mode it is sent inline.
+    """
+    input_mode = input_mode or const.RUNPOD_INPUT_MODE
+    payload_input = {"type": operation, "model_params": model_params}
+    if input_mode == "s3":
+        model_params["input_s3_bucket"] = const.INPUT_STAGING_BUCKET
+        model_params["input_s3_key"] = stage_input(image_bytes)
+    else:
+        payload_input["base64_image"] = base64.b64encode(image_bytes).decode('utf-8')
+    return {"input": payload_input}
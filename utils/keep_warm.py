@@ -0,0 +1,104 @@
+# utils/keep_warm.py
+
+import threading
+import time
+from datetime import datetime
+
+import constants as const
+from utils import endpoint_router, runpod_client
+
+# The worker must return right away for this job type; see KEEP_WARM_ENABLED
+_WARMUP_PAYLOAD = {"input": {"type": "warmup"}}
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def endpoints_for(routes):
+    """
+    Return the distinct endpoint IDs behind a list of routes.
+    """
+    endpoint_ids = []
+    for route in routes:
+        for endpoint_id in const.RUNPOD_ROUTES.get(route, {const.RUNPOD_ENDPOINT_ID: 1}):
+            if endpoint_id not in endpoint_ids:
+                endpoint_ids.append(endpoint_id)
+    return endpoint_ids
+
+
+def endpoint_state(endpoint_id):
+    """
+    Return "warm", "warming up", "cold" or "unknown" from the latest health sample of an endpoint.
+    """
+    workers = endpoint_router.worker_counts(endpoint_id)
+    if workers is None:
+        return "unknown"
+    if workers.get("idle", 0) + workers.get("running", 0) + workers.get("ready", 0) > 0:
+        return "warm"
+    if workers.get("initializing", 0) > 0:
+        return "warming up"
+    return "cold"
+
+
+def route_state(routes):
+    """
+    Summarise the state of the endpoints behind some routes, reporting the warmest one.
+    """
+    states = [endpoint_state(endpoint_id) for endpoint_id in endpoints_for(routes)]
+    for state in ["warm", "warming up", "cold"]:
+        if state in states:
+            return state
+    return "unknown"
+
+
+def _idle_for(endpoint_id, seconds):
+    # Real jobs and earlier warm-ups both count as traffic, so busy endpoints are never pinged
+    elapsed = endpoint_router.seconds_since_submit(endpoint_id)
+    return elapsed is None or elapsed >= seconds
+
+
+def ping(endpoint_id):
+    """
+    Send a no-op job that makes RunPod start (or keep) a worker. Returns the job Future.
+    """
+    return runpod_client.submit(_WARMUP_PAYLOAD, endpoint_id, deadline=const.KEEP_WARM_DEADLINE)
+
+
+def prewarm(routes):
+    """
+    Wake the endpoints behind a service before the user submits anything. Cold endpoints that saw no
+    recent traffic get a warm-up job; the call never blocks.
+    """
+    if not const.KEEP_WARM_ENABLED:
+        return
+    for endpoint_id in endpoints_for(routes):
+        if endpoint_state(endpoint_id) != "warm" and _idle_for(endpoint_id, const.KEEP_WARM_PREWARM_COOLDOWN):
+            ping(endpoint_id)
+
+
+def _in_active_hours():
+    start, end = const.KEEP_WARM_ACTIVE_HOURS
+    return start <= datetime.now().hour < end
+
+
+def _run():
+    while True:
+        if _in_active_hours():
+            for endpoint_id in endpoints_for(const.KEEP_WARM_ROUTES):
+                if _idle_for(endpoint_id, const.KEEP_WARM_INTERVAL):
+                    ping(endpoint_id)
+        # Check often enough that no endpoint stays idle much longer than the interval
+        time.sleep(const.KEEP_WARM_INTERVAL / 4)
+
+
+def start():
+    """
+    Start the background keep-warm thread once per process.
+    """
+    global _thread
+    if not const.KEEP_WARM_ENABLED:
+        return
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name="runpod-keep-warm", daemon=True)
+            _thread.start()
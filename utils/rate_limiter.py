@@ -0,0 +1,147 @@
+# utils/rate_limiter.py
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+import constants as const
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    In-process token bucket. reserve() always takes the tokens, letting the balance go negative, and
+    returns how long the caller has to wait before it may proceed.
+    """
+
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_second)
+            self._updated = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.refill_per_second)
+
+
+class SQLiteTokenBucket:
+    """
+    Token bucket stored in a SQLite file so every process on the host draws from the same budget.
+    """
+
+    def __init__(self, path, name, capacity, refill_per_second):
+        self.path = path
+        self.name = name
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        connection = self._connect()
+        try:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+        finally:
+            connection.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def reserve(self, amount):
+        connection = self._connect()
+        try:
+            # Take the write lock up front so concurrent processes cannot read the same balance
+            connection.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = connection.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + (now - row[1]) * self.refill_per_second)
+            tokens -= amount
+            connection.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (self.name, tokens, now)
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            # BEGIN IMMEDIATE itself can fail (database is locked), leaving nothing to roll back
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+        return max(0.0, -tokens / self.refill_per_second)
+
+
+def _bucket(provider, kind, per_minute):
+    if const.RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteTokenBucket(const.RATE_LIMIT_DB_PATH, f"{provider}:{kind}", per_minute, per_minute / 60.0)
+    return TokenBucket(per_minute, per_minute / 60.0)
+
+
+class RateLimiter:
+    """
+    Request and token budgets for one provider.
+    """
+
+    def __init__(self, provider, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = _bucket(provider, "requests", requests_per_minute) if requests_per_minute else None
+        self.tokens = _bucket(provider, "tokens", tokens_per_minute) if tokens_per_minute else None
+
+    def reserve(self, tokens=0):
+        """
+        Reserve one request and `tokens` tokens and return the seconds to wait before sending it.
+        """
+        wait = 0.0
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+
+def get_limiter(provider):
+    """
+    Return the shared limiter for a provider, or None when the provider has no configured budget.
+    """
+    with _limiters_lock:
+        if provider not in _limiters:
+            limits = const.RATE_LIMITS.get(provider)
+            _limiters[provider] = RateLimiter(provider, **limits) if limits else None
+        return _limiters[provider]
+
+
+def acquire(provider, tokens=0):
+    """
+    Block until the provider's budget allows one more request using `tokens` tokens.
+    """
+    limiter = get_limiter(provider)
+    if limiter is not None:
+        wait = limiter.reserve(tokens)
+        if wait:
+            time.sleep(wait)
+
+
+async def acquire_async(provider, tokens=0):
+    """
+    Awaitable version of acquire() that does not block the event loop.
+    """
+    limiter = get_limiter(provider)
+    if limiter is not None:
+        wait = limiter.reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+
+
+def estimate_tokens(text, max_completion_tokens=0):
+    """
+    Rough token count for budgeting: about four characters per token plus the completion allowance.
+    """
+    return len(text) // 4 + max_completion_tokens
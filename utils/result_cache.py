@@ -0,0 +1,229 @@
+# utils/result_cache.py
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+
+import constants as const
+from utils.clients import get_s3_client
+
+# model_params entries that do not change the produced image
+_VOLATILE_PARAMS = ["aws_save_name", "return_base64", "inline_max_bytes", "input_s3_bucket", "input_s3_key"]
+
+
+class DiskLRUCache:
+    """
+    Size-bounded cache of byte blobs on local disk with least-recently-used eviction.
+    Each entry is a data file plus an optional JSON metadata sidecar; recency is tracked through the file mtime.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _entries(self):
+        # Yields (mtime, size, path) for every data file in the cache
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith((".json", ".tmp")):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def get(self, key):
+        """
+        Return (data, meta) for a key, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            meta = {}
+            if os.path.exists(path + ".json"):
+                with open(path + ".json") as f:
+                    meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            # Missing, evicted or unreadable entries are all misses
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return data, meta
+
+    def put(self, key, data, meta=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+
+        # Metadata goes first so a reader that finds the data also finds its metadata
+        if meta is not None:
+            self._write_atomic(path + ".json", json.dumps(meta).encode('utf-8'))
+        self._write_atomic(path, data)
+
+        with self._lock:
+            self._size += len(data) - previous_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _write_atomic(self, path, data):
+        # Every writer gets its own temporary file, so concurrent puts of a key never share one
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _evict(self):
+        # Drop the least recently used entries until the cache is back under 90% of its budget
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(self._entries()):
+            if self._size <= target:
+                break
+            for stale in (path, path + ".json"):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            self._size -= size
+
+
+_disk_cache = None
+_disk_cache_lock = threading.Lock()
+_s3_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="result-cache-s3")
+
+_stats = {"hits": 0, "disk_hits": 0, "s3_hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def _get_disk_cache():
+    global _disk_cache
+    with _disk_cache_lock:
+        if _disk_cache is None:
+            _disk_cache = DiskLRUCache(const.RESULT_CACHE_DIR, const.RESULT_CACHE_MAX_BYTES)
+        return _disk_cache
+
+
+def _record(*counters):
+    with _stats_lock:
+        for counter in counters:
+            _stats[counter] += 1
+
+
+def get_stats():
+    """
+    Return a snapshot of the hit/miss counters.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def cache_key(operation, image_bytes, model_params):
+    """
+    Hash the input image together with the normalized model parameters of an operation.
+    """
+    params = {k: v for k, v in model_params.items() if k not in _VOLATILE_PARAMS}
+    digest = hashlib.sha256()
+    digest.update(operation.encode('utf-8'))
+    digest.update(hashlib.sha256(image_bytes).digest())
+    digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _s3_get(key):
+    try:
+        response = get_s3_client().get_object(Bucket=const.RESULTS_BUCKET, Key=f"{const.RESULT_CACHE_S3_PREFIX}/{key}")
+    except Exception:
+        return None
+    return response['Body'].read(), response.get('Metadata', {})
+
+
+def _s3_put(key, data, meta):
+    try:
+        get_s3_client().put_object(
+            Bucket=const.RESULTS_BUCKET,
+            Key=f"{const.RESULT_CACHE_S3_PREFIX}/{key}",
+            Body=data,
+            Metadata=meta
+        )
+    except Exception as e:
+        print(f"Failed to write result cache entry {key} to S3: {e}")
+
+
+def get(key):
+    """
+    Look a key up in the disk tier, then the S3 tier if enabled. Returns (data, meta) or None.
+    """
+    entry = _get_disk_cache().get(key)
+    if entry is not None:
+        _record("hits", "disk_hits")
+        return entry
+
+    if const.RESULT_CACHE_S3_ENABLED:
+        entry = _s3_get(key)
+        if entry is not None:
+            _record("hits", "s3_hits")
+            # Promote to the local tier for the next lookup
+            _get_disk_cache().put(key, *entry)
+            return entry
+
+    _record("misses")
+    return None
+
+
+def put(key, data, meta):
+    _get_disk_cache().put(key, data, meta)
+    if const.RESULT_CACHE_S3_ENABLED:
+        _s3_writer.submit(_s3_put, key, data, meta)
+
+
+def lookup_image_result(operation, image_bytes, model_params):
+    """
+    Return the cached (image, image_bytes, object_key) for an operation on an input, or None on a miss.
+    """
+    entry = get(cache_key(operation, image_bytes, model_params))
+    if entry is None:
+        return None
+    data, meta = entry
+    return Image.open(BytesIO(data)), data, meta.get("object_key")
+
+
+def store_image_result(operation, image_bytes, model_params, result):
+    _, result_bytes, object_key = result
+    put(cache_key(operation, image_bytes, model_params), result_bytes, {"object_key": object_key})
+
+
+def cached_image_result(operation, image_bytes, model_params, compute):
+    """
+    Return the cached (image, image_bytes, object_key) for an operation on an input, calling compute() on a miss.
+    """
+    result = lookup_image_result(operation, image_bytes, model_params)
+    if result is None:
+        result = compute()
+        store_image_result(operation, image_bytes, model_params, result)
+    return result
@@ -0,0 +1,122 @@
+# utils/result_transport.py
+
+import base64
+from io import BytesIO
+
+from PIL import Image
+
+import constants as const
+from utils import s3_transfer
+from utils.clients import get_s3_client
+
+
+def request_inline(model_params):
+    """
+    Ask the worker to return results up to RUNPOD_INLINE_MAX_BYTES inline instead of only writing them to S3.
+    Inline results come back base64-encoded in the output's "inline" field; "image" stays the S3 reference.
+    """
+    model_params["return_base64"] = True
+    model_params["inline_max_bytes"] = const.RUNPOD_INLINE_MAX_BYTES
+    return model_params
+
+
+def request_preview(model_params):
+    """
+    Ask the worker to return only a small preview inline; the full result stays in S3 and is served by presigned URL.
+    The preview comes back base64-encoded in the output's "preview" field.
+    """
+    model_params["return_base64"] = False
+    model_params["return_preview"] = True
+    model_params["preview_max_size"] = const.PREVIEW_MAX_SIZE
+    return model_params
+
+
+def request_delivery(model_params, preview_only=False):
+    if preview_only:
+        return request_preview(model_params)
+    return request_inline(model_params)
+
+
+def decode_inline(output, field="inline"):
+    """
+    Return the encoded image bytes a worker output carries base64-encoded in `field`, or None if the worker
+    left the result in S3 only.
+    """
+    value = output.get(field)
+    if not value:
+        return None
+    if value.startswith("data:"):
+        # data:image/png;base64,<payload>
+        value = value.split(",", 1)[-1]
+    return base64.b64decode(value)
+
+
+def fetch_object(bucket, key):
+    """
+    Download an S3 object with concurrent ranged GETs into a preallocated buffer.
+    """
+    return s3_transfer.download_object(bucket, key)
+
+
+def upload_object(bucket, key, data):
+    """
+    Store encoded image bytes produced on this side (e.g. stitched tiles) where the worker would have written them.
+    """
+    s3_transfer.upload_bytes(data, bucket, key)
+
+
+def make_preview(image_bytes):
+    """
+    Shrink encoded image bytes to a PNG no larger than PREVIEW_MAX_SIZE on either side.
+    """
+    image = Image.open(BytesIO(image_bytes))
+    image.thumbnail((const.PREVIEW_MAX_SIZE, const.PREVIEW_MAX_SIZE))
+    buffered = BytesIO()
+    image.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def fetch_preview(output, bucket, object_key):
+    """
+    Return the encoded preview of a RunPod output.
+    """
+    preview_bytes = decode_inline(output, "preview")
+    if preview_bytes is not None:
+        return preview_bytes
+    # Workers without preview support only wrote the full result, so shrink it here
+    return make_preview(fetch_object(bucket, object_key))
+
+
+def object_dpi(bucket, key):
+    """
+    Return the DPI an S3 image object is tagged with, rounded, or None if it has none.
+    Only the start of the object is fetched; PNG and JPEG keep the DPI ahead of the pixel data.
+    """
+    response = get_s3_client().get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{const.DPI_PROBE_BYTES - 1}")
+    try:
+        with Image.open(BytesIO(response['Body'].read())) as image:
+            dpi = image.info.get('dpi')
+    except Exception:
+        return None
+    return tuple(round(d) for d in dpi) if dpi else None
+
+
+def presigned_download_url(bucket, key, file_name=None):
+    """
+    Return a time-limited URL the browser can download the object from directly.
+    """
+    params = {'Bucket': bucket, 'Key': key}
+    if file_name:
+        params['ResponseContentDisposition'] = f'attachment; filename="{file_name}"'
+    return get_s3_client().generate_presigned_url('get_object', Params=params, ExpiresIn=const.PRESIGNED_URL_EXPIRY)
+
+
+def fetch_result(output, bucket, object_key):
+    """
+    Return the encoded image bytes of a RunPod output, exactly as the worker produced them.
+    Inline payloads are decoded directly; results the worker only wrote to S3 are fetched from the bucket.
+    """
+    image_bytes = decode_inline(output)
+    if image_bytes is not None:
+        return image_bytes
+    return fetch_object(bucket, object_key)
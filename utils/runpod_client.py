@@ -0,0 +1,318 @@
+# utils/runpod_client.py
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+
+import runpod
+import requests
+
+import constants as const
+from utils import endpoint_router
+
+runpod.api_key = os.environ.get("RUNPOD_API_KEY")
+
+_endpoints = {}
+_endpoints_lock = threading.Lock()
+_submit_executor = ThreadPoolExecutor(max_workers=const.RUNPOD_SUBMIT_WORKERS, thread_name_prefix="runpod-submit")
+
+_queue_waits = {}
+_queue_waits_lock = threading.Lock()
+
+
+class RunPodJobError(ValueError):
+    """
+    Raised when a RunPod job ends in FAILED, TIMED_OUT or CANCELLED.
+    """
+
+    def __init__(self, job_id, status):
+        super().__init__(f"RunPod job {job_id} ended with status {status}")
+        self.job_id = job_id
+        self.status = status
+
+
+class RunPodDeadlineError(RunPodJobError):
+    """
+    Raised when a job does not finish before its operation deadline. The job is cancelled on RunPod.
+    """
+
+    def __init__(self, job_id, deadline):
+        ValueError.__init__(self, f"RunPod job {job_id} did not finish within {deadline:.0f}s and was cancelled")
+        self.job_id = job_id
+        self.status = "DEADLINE_EXCEEDED"
+
+
+def get_endpoint(endpoint_id=None):
+    """
+    Return the shared runpod.Endpoint for an endpoint ID (the default endpoint if none is given).
+    """
+    endpoint_id = endpoint_id or const.RUNPOD_ENDPOINT_ID
+    with _endpoints_lock:
+        if endpoint_id not in _endpoints:
+            _endpoints[endpoint_id] = runpod.Endpoint(endpoint_id)
+        return _endpoints[endpoint_id]
+
+
+def deadline_for(operation):
+    """
+    Return the number of seconds a job of the given operation may take from submission to output.
+    """
+    return const.RUNPOD_DEADLINES.get(operation, const.RUNPOD_DEFAULT_DEADLINE)
+
+
+def _with_ttl(payload, seconds):
+    # RunPod drops the job on its side as well once the TTL passes, even if this process is gone
+    policy = dict(payload.get("policy", {}))
+    policy["ttl"] = max(int(seconds * 1000), 10000)
+    return {**payload, "policy": policy}
+
+
+def record_queue_wait(endpoint_id, seconds):
+    """
+    Record how long a job waited in an endpoint's queue before a worker picked it up.
+    """
+    with _queue_waits_lock:
+        if endpoint_id not in _queue_waits:
+            _queue_waits[endpoint_id] = deque(maxlen=const.RUNPOD_QUEUE_WAIT_WINDOW)
+        _queue_waits[endpoint_id].append(seconds)
+
+
+def queue_wait_percentile(endpoint_id, percentile=const.RUNPOD_HEDGE_PERCENTILE):
+    """
+    Return the given percentile of the recent queue waits on an endpoint, or None without enough samples.
+    """
+    with _queue_waits_lock:
+        waits = sorted(_queue_waits.get(endpoint_id, []))
+    if len(waits) < const.RUNPOD_HEDGE_MIN_SAMPLES:
+        return None
+    return waits[min(int(len(waits) * percentile), len(waits) - 1)]
+
+
+def _hedge_delay(endpoint_id):
+    delay = queue_wait_percentile(endpoint_id)
+    return const.RUNPOD_HEDGE_DEFAULT_DELAY if delay is None else delay
+
+
+def _hedge_endpoint(operation, endpoint_id, alternatives=()):
+    if not const.RUNPOD_HEDGE_ENABLED or operation not in const.RUNPOD_HEDGE_OPERATIONS:
+        return None
+    # Prefer the next best endpoint on the operation's route, then the configured secondary
+    for secondary in [*alternatives, const.RUNPOD_HEDGE_ENDPOINT_ID]:
+        if secondary and secondary != endpoint_id:
+            return secondary
+    return None
+
+
+def _cancel(job):
+    try:
+        job.cancel()
+    except Exception as e:
+        print(f"Failed to cancel RunPod job {job.job_id}: {e}")
+
+
+def _set_result(future, result):
+    # The caller may cancel the Future at any point, so settling it can race
+    try:
+        future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+def _set_exception(future, exception):
+    try:
+        future.set_exception(exception)
+    except InvalidStateError:
+        pass
+
+
+class _PendingJob:
+    def __init__(self, job, future, endpoint_id, deadline, hedge=None):
+        self.job = job
+        self.future = future
+        self.endpoint_id = endpoint_id
+        self.deadline = deadline
+        self.hedge = hedge
+        self.submitted_at = time.monotonic()
+        self.hedge_at = self.submitted_at + _hedge_delay(endpoint_id) if hedge else None
+        self.queued = True
+        self.finished = False
+        self.status_errors = 0
+        self.interval = const.RUNPOD_POLL_INITIAL_INTERVAL
+        self.next_poll = self.submitted_at + self.interval
+
+
+class JobPoller:
+    """
+    Tracks every in-flight RunPod job from a single background thread.
+    Each job is polled on its own adaptive schedule and resolves a Future when it reaches a final state.
+    Jobs whose Future is settled elsewhere (cancelled, past its deadline, or won by a hedged duplicate) are cancelled on RunPod.
+    """
+
+    def __init__(self):
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def watch(self, job, future=None, endpoint_id=None, deadline=None, hedge=None):
+        if future is None:
+            future = Future()
+        if deadline is None:
+            deadline = time.monotonic() + const.RUNPOD_DEFAULT_DEADLINE
+        with self._lock:
+            self._pending.append(_PendingJob(job, future, endpoint_id or job.endpoint_id, deadline, hedge))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="runpod-poller", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return future
+
+    def _run(self):
+        while True:
+            # Clear before reading the queue so a watch() during this pass is never missed
+            self._wakeup.clear()
+            with self._lock:
+                pending = list(self._pending)
+
+            now = time.monotonic()
+            for item in pending:
+                if item.next_poll <= now:
+                    self._poll(item)
+
+            with self._lock:
+                abandoned = [item for item in self._pending if item.future.done() and not item.finished]
+                self._pending = [item for item in self._pending if not item.future.done()]
+                next_poll = min((item.next_poll for item in self._pending), default=None)
+
+            # Free the GPU capacity held by jobs nobody is waiting for any more
+            for item in abandoned:
+                _submit_executor.submit(_cancel, item.job)
+
+            timeout = None if next_poll is None else max(0.0, next_poll - time.monotonic())
+            self._wakeup.wait(timeout)
+
+    def _poll(self, item):
+        if item.future.done():
+            return
+
+        now = time.monotonic()
+        if now >= item.deadline:
+            _set_exception(item.future, RunPodDeadlineError(item.job.job_id, item.deadline - item.submitted_at))
+            return
+
+        try:
+            status = item.job.status()
+            if item.queued and status != "IN_QUEUE":
+                item.queued = False
+                record_queue_wait(item.endpoint_id, now - item.submitted_at)
+
+            if status == "COMPLETED":
+                output = item.job.output()
+                item.finished = True
+                _set_result(item.future, output)
+            elif status in ["FAILED", "TIMED_OUT", "CANCELLED"]:
+                item.finished = True
+                _set_exception(item.future, RunPodJobError(item.job.job_id, status))
+            else:
+                # Queued longer than usual: race a duplicate on the secondary endpoint, once
+                if item.queued and item.hedge and now >= item.hedge_at:
+                    hedge, item.hedge = item.hedge, None
+                    hedge()
+                # Still queued or running: back off up to the maximum interval
+                item.interval = min(item.interval * const.RUNPOD_POLL_BACKOFF, const.RUNPOD_POLL_MAX_INTERVAL)
+                item.next_poll = min(time.monotonic() + item.interval, item.deadline)
+            item.status_errors = 0
+        except Exception as e:
+            # A transient API error should not throw away a job that is still running
+            item.status_errors += 1
+            if item.status_errors < const.RUNPOD_STATUS_MAX_ERRORS:
+                item.interval = min(item.interval * const.RUNPOD_POLL_BACKOFF, const.RUNPOD_POLL_MAX_INTERVAL)
+                item.next_poll = min(time.monotonic() + item.interval, item.deadline)
+                return
+            # Giving up leaves the job unfinished, so the poller cancels it on RunPod
+            _set_exception(item.future, e)
+
+
+_poller = JobPoller()
+
+
+def _submit_job(payload, endpoint_id, future, deadline, hedge_endpoint_id=None, is_hedge=False):
+    def _submit():
+        if future.done():
+            return
+        try:
+            job = get_endpoint(endpoint_id).run(_with_ttl(payload, deadline - time.monotonic()))
+        except Exception as e:
+            # A failed hedge leaves the original job running, so only the primary submission fails the Future
+            if is_hedge:
+                print(f"Failed to submit hedged job to {endpoint_id}: {e}")
+            else:
+                _set_exception(future, e)
+            return
+
+        endpoint_router.note_submitted(endpoint_id)
+        hedge = None
+        if hedge_endpoint_id:
+            hedge = lambda: _submit_job(payload, hedge_endpoint_id, future, deadline, is_hedge=True)
+        _poller.watch(job, future, endpoint_id, deadline, hedge)
+
+    _submit_executor.submit(_submit)
+
+
+def submit(payload, endpoint_id=None, deadline=None):
+    """
+    Submit a job without blocking and return a Future that resolves to the job output.
+    Without an explicit endpoint the job goes to the least loaded endpoint on its operation's route.
+    The job is cancelled once it runs past its operation deadline. With hedging enabled, a job still queued
+    after the endpoint's usual queue wait is duplicated onto the secondary endpoint and the first result wins.
+    """
+    if endpoint_id:
+        alternatives = []
+    else:
+        endpoint_id, *alternatives = endpoint_router.rank_endpoints(payload)
+    operation = payload["input"].get("type")
+    deadline = time.monotonic() + (deadline or deadline_for(operation))
+
+    future = Future()
+    _submit_job(payload, endpoint_id, future, deadline, _hedge_endpoint(operation, endpoint_id, alternatives))
+    return future
+
+
+def submit_many(payloads, endpoint_id=None, deadline=None):
+    """
+    Submit several jobs concurrently and return their Futures in the same order.
+    """
+    return [submit(payload, endpoint_id, deadline) for payload in payloads]
+
+
+def run(payload, endpoint_id=None, timeout=None):
+    """
+    Submit a job and wait for its output.
+    Operations listed in RUNPOD_SYNC_OPERATIONS go through run_sync instead of the poller.
+    """
+    if payload["input"].get("type") in const.RUNPOD_SYNC_OPERATIONS:
+        return run_sync(payload, endpoint_id)
+    return submit(payload, endpoint_id).result(timeout)
+
+
+def run_sync(payload, endpoint_id=None, timeout=const.RUNPOD_SYNC_TIMEOUT):
+    """
+    Run a short job through the endpoint's runsync route and return its output.
+    """
+    endpoint_id = endpoint_id or endpoint_router.rank_endpoints(payload)[0]
+    endpoint_router.note_submitted(endpoint_id)
+    try:
+        return get_endpoint(endpoint_id).run_sync(_with_ttl(payload, timeout), timeout=timeout)
+    except (TimeoutError, requests.exceptions.Timeout):
+        # The TTL makes RunPod drop the job on its side, so there is nothing left to cancel here
+        raise RunPodDeadlineError(None, timeout)
+
+
+def wait_async(future):
+    """
+    Wrap a job Future so it can be awaited from asyncio code.
+    """
+    return asyncio.wrap_future(future)
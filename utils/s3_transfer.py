@@ -0,0 +1,70 @@
+# utils/s3_transfer.py
+
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from boto3.s3.transfer import TransferConfig
+
+import constants as const
+from utils.clients import get_s3_client
+
+_part_executor = ThreadPoolExecutor(max_workers=const.S3_TRANSFER_CONCURRENCY, thread_name_prefix="s3-part")
+
+
+def transfer_config():
+    """
+    Multipart settings shared by every upload.
+    """
+    return TransferConfig(
+        multipart_threshold=const.S3_TRANSFER_PART_SIZE,
+        multipart_chunksize=const.S3_TRANSFER_PART_SIZE,
+        max_concurrency=const.S3_TRANSFER_CONCURRENCY,
+        use_threads=True,
+    )
+
+
+def _get_range(bucket, key, start, end):
+    return get_s3_client().get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}")
+
+
+def download_object(bucket, key):
+    """
+    Download an S3 object with concurrent ranged GETs, each written straight into its slice of a
+    preallocated buffer. Large objects come back as that bytearray rather than a bytes copy of it.
+    """
+    part_size = const.S3_TRANSFER_PART_SIZE
+
+    # The first part also tells us the total size, so small objects need a single request
+    response = _get_range(bucket, key, 0, part_size - 1)
+    first_part = response['Body'].read()
+    size = int(response['ContentRange'].split('/')[-1])
+    if size <= len(first_part):
+        return first_part
+
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    view[:len(first_part)] = first_part
+
+    def fetch_part(start):
+        end = min(start + part_size, size) - 1
+        body = _get_range(bucket, key, start, end)['Body']
+        # Read the stream directly into the slice instead of building an intermediate copy
+        target = view[start:end + 1]
+        offset = 0
+        while offset < len(target):
+            read = body.readinto(target[offset:])
+            if not read:
+                raise IOError(f"Unexpected end of stream while downloading {key} at byte {start + offset}")
+            offset += read
+
+    # Consume the results so a failed part raises here
+    list(_part_executor.map(fetch_part, range(len(first_part), size, part_size)))
+    view.release()
+    return buffer
+
+
+def upload_bytes(data, bucket, key):
+    """
+    Upload in-memory bytes, switching to a concurrent multipart upload for large objects.
+    """
+    get_s3_client().upload_fileobj(BytesIO(data), bucket, key, Config=transfer_config())
@@ -1,93 +1,86 @@
-import requests
 from PIL import Image
 from io import BytesIO
 import os 
 import streamlit as st
-import time
 from datetime import datetime
-import runpod
 import base64
 from utils import *
-from openai import OpenAI
+from utils import runpod_client, result_transport, result_cache, tiled_upscale, input_staging, clients, gpu_batch, ideogram_client, rate_limiter, generation_cache, description_cache, vision_preprocess
 import json
+from concurrent.futures import ThreadPoolExecutor
 import constants as const 
-import boto3
 
-runpod.api_key = os.environ.get("RUNPOD_API_KEY")
-
-# Define the endpoint ID
-endpoint = runpod.Endpoint("vdazldfyhyb2kr")
+def upscale_model_params(upscale_factor):
+    """
+    Pick the upscaler model and server-side tiling for an upscale factor.
+    """
+    if upscale_factor < 2.000001:
+        return {
+            "upscale_factor": upscale_factor,
+            "upscaler_model_name":"RealESRGAN_x2plus",
+            "tile": 0
+        }
+    else:
+        return {
+            "upscale_factor": upscale_factor,
+            "upscaler_model_name":"RealESRGAN_x4plus",
+            "tile": 1200
+        }
 
-def upscale_image(service_url, image_bytes, upscale_factor):
-    # Convert image bytes to a base64 string
-    base64_image = base64.b64encode(image_bytes).decode('utf-8')
 
+def upscale_image(service_url, image_bytes, upscale_factor, preview_only=False):
     # Get the current timestamp and format the filename
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
     filename = f"{timestamp}_upscaled_image.png"
-    if upscale_factor < 2.000001:
-        # Define the payload for upscaling
-        payload = {
-            "input": {
-                "base64_image": base64_image,
-                "type": "upscale",
-                "model_params": {
-                    "upscale_factor": upscale_factor,
-                    "aws_save_name": filename,
-                    "upscaler_model_name":"RealESRGAN_x2plus",
-                    "tile": 0
-                },
-                
-            }
-        }
-    else:
-                # Define the payload for upscaling
-        payload = {
-            "input": {
-                "base64_image": base64_image,
-                "type": "upscale",
-                "model_params": {
-                    "upscale_factor": upscale_factor,
-                    "aws_save_name": filename,
-                    "upscaler_model_name":"RealESRGAN_x4plus",
-                    "tile": 1200
-                },
-                
-            }
-        }
 
-    # Run the request
-    endpoint = runpod.Endpoint("vdazldfyhyb2kr")
-    run_request = endpoint.run(payload)
+    # Define the model parameters for upscaling
+    model_params = upscale_model_params(upscale_factor)
+    model_params["aws_save_name"] = filename
+    result_transport.request_delivery(model_params, preview_only)
+
+    object_key = f"staging-upscaled-images/{filename}"
+
+    # Large print files are split into tiles and upscaled across several workers
+    with Image.open(BytesIO(image_bytes)) as image:
+        tiled = image.width * image.height > const.TILED_UPSCALE_MIN_PIXELS
+    if tiled:
+        compute = lambda: tiled_upscale.upscale_tiled(image_bytes, upscale_factor, model_params, object_key, preview_only)
+    else:
+        # Run the request through the shared job client
+        compute = lambda: image_result(
+            runpod_client.run(input_staging.image_payload("upscale", image_bytes, model_params)),
+            object_key,
+            preview_only
+        )
 
-    # Check the status of the request
-    status = run_request.status()
-    while status in ["IN_QUEUE", "IN_PROGRESS"]:
-        time.sleep(1)
-        status = run_request.status()
+    # Skip the GPU entirely when the same upscale is already cached
+    return result_cache.cached_image_result("upscale", image_bytes, model_params, compute)
 
-    # Get the output
-    output = run_request.output()
 
+def image_result(output, object_key, preview_only=False):
+    """
+    Turn a RunPod output into (image, image_bytes, object_key).
+    The bytes are passed through exactly as the worker encoded them and the image is opened lazily from them.
+    With preview_only the image and bytes are a small preview and the full result stays at object_key.
+    """
     # Assuming the output contains the image details
-    if 'image' in output and output['image'] is not None:
-        bucket_name = "readytoprint-images"
-        object_key = f"staging-upscaled-images/{filename}"
-        image = image_from_s3(bucket_name, object_key)
-        return image, object_key
+    if output and output.get('image') is not None:
+        object_key = output.get('object_key', object_key)
+        if preview_only:
+            image_bytes = result_transport.fetch_preview(output, const.RESULTS_BUCKET, object_key)
+        else:
+            image_bytes = result_transport.fetch_result(output, const.RESULTS_BUCKET, object_key)
+        return Image.open(BytesIO(image_bytes)), image_bytes, object_key
     else:
         raise ValueError("Output does not contain a valid image URL")
 
 
 def image_from_s3(bucket, key):
-    s3_client = boto3.resource('s3')
-    bucket = s3_client.Bucket(bucket)
-    image = bucket.Object(key)
-    img_data = image.get().get('Body').read()
+    img_data = result_transport.fetch_object(bucket, key)
     return Image.open(BytesIO(img_data))
 
 def download_image(s3_link):
-    s3_response = requests.get(s3_link)
+    s3_response = clients.get_http_session().get(s3_link)
     
     if s3_response.status_code == 200:
         return Image.open(BytesIO(s3_response.content)), s3_response.content
@@ -95,102 +88,179 @@ def download_image(s3_link):
         return None, None
 
 
-def resize_with_bleed(image_bytes, width, height, bleed_w,bleed_h):
-    # Convert image bytes to a base64 string
-    base64_image = base64.b64encode(image_bytes).decode('utf-8')
-
+def resize_with_bleed(image_bytes, width, height, bleed_w,bleed_h, preview_only=False, remove_bg=False, upscale_factor=1):
+    """
+    Add bleed around an image that measures width x height pixels once prepared.
+    Preparation optionally removes the background and upscales the image first. With RUNPOD_PIPELINE_ENABLED
+    the preparation and the bleed run as one job so intermediates stay on the worker; otherwise each step is its own job.
+    """
     # Get the current timestamp and format the filename
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
     filename = f"{timestamp}_outpainted_image.png"
 
-    # Define the payload for resizing with bleed
-    payload = {
-        "input": {
-            "base64_image": base64_image,
-            "type": "outpaint",
-            "model_params": {
-                "target_resolution": [int(width), int(height)],
-                "bleed_size_w": int(bleed_w),
-                "bleed_size_h": int(bleed_h),
-                "aws_save_name": filename
-            }
-        }
+    outpaint_params = {
+        "target_resolution": [int(width), int(height)],
+        "bleed_size_w": int(bleed_w),
+        "bleed_size_h": int(bleed_h),
+        "output_dpi": 300
     }
-    
-
-    # Run the request
-    endpoint = runpod.Endpoint("vdazldfyhyb2kr")
-    run_request = endpoint.run(payload)
 
-    # Check the status of the request
-    status = run_request.status()
-    while status in ["IN_QUEUE", "IN_PROGRESS"]:
-        time.sleep(1)
-        status = run_request.status()
-
-    # Get the output
-    output = run_request.output()
-    # Assuming the output contains the image details
-    if 'image' in output and output['image'] is not None:
-        bucket_name = "readytoprint-images"
-        object_key = f"outpainted-images/{filename}"
-        print(output['image'])
-        print(object_key)
-        image = image_from_s3(bucket_name, object_key)
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        image_bytes = buffered.getvalue()
-        return image, image_bytes
-    else:
-        raise ValueError("Output does not contain a valid image URL")
+    prepare_steps = []
+    if remove_bg:
+        prepare_steps.append(pipeline_step("remove_bg"))
+    if upscale_factor > 1:
+        prepare_steps.append(pipeline_step("upscale", **upscale_model_params(upscale_factor)))
+    if prepare_steps and const.RUNPOD_PIPELINE_ENABLED:
+        return run_pipeline(image_bytes, [*prepare_steps, pipeline_step("outpaint", **outpaint_params)], preview_only)
+
+    if remove_bg:
+        image_bytes = remove_background(image_bytes)[1]
+    if upscale_factor > 1:
+        image_bytes = upscale_image(const.UPSCALE_SERVICE_URL, image_bytes, upscale_factor)[1]
+
+    # Define the model parameters for resizing with bleed
+    model_params = result_transport.request_delivery(dict(outpaint_params, aws_save_name=filename), preview_only)
+
+    # Run the request through the shared job client unless the same bleed is already cached
+    return result_cache.cached_image_result(
+        "outpaint", image_bytes, model_params,
+        lambda: image_result(
+            runpod_client.run(input_staging.image_payload("outpaint", image_bytes, model_params)),
+            f"outpainted-images/{filename}",
+            preview_only
+        )
+    )
 
 def remove_background(image_bytes):
-    # Convert image bytes to a base64 string
-    base64_image = base64.b64encode(image_bytes).decode('utf-8')
-
     # Get the current timestamp and format the filename
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
     filename = f"{timestamp}_bg_removed_image.png"
 
+    model_params = result_transport.request_inline({
+        "aws_save_name": filename
+    })
 
-    payload = {
-            "input": {
-                "base64_image": base64_image,
-                "type": "remove_bg",
-                "model_params": {
-                    "aws_save_name": filename
-                }
-            }
-    }
+    # Run the request through the shared job client unless the same removal is already cached
+    return result_cache.cached_image_result(
+        "remove_bg", image_bytes, model_params,
+        lambda: image_result(
+            runpod_client.run(input_staging.image_payload("remove_bg", image_bytes, model_params)),
+            f"removed-bg-images/{filename}"
+        )
+    )
 
-    # Run the request
-    endpoint = runpod.Endpoint("vdazldfyhyb2kr")
-    run_request = endpoint.run(payload)
 
-    # Check the status of the request
-    status = run_request.status()
-    while status in ["IN_QUEUE", "IN_PROGRESS"]:
-        time.sleep(1)
-        status = run_request.status()
+def run_image_batch(operation, images, model_params, object_prefix, file_suffix):
+    """
+    Run an operation over many images, packing the uncached ones into batched RunPod jobs.
+    Yields (index, result) as results arrive, where result is (image, image_bytes, object_key) or the
+    exception raised for that image.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    file_names = [f"{timestamp}_{index}_{file_suffix}" for index in range(len(images))]
+
+    # Batched results come back inline when small, so many of them fit in one job output
+    model_params = result_transport.request_inline(dict(model_params))
+    model_params["inline_max_bytes"] = const.GPU_BATCH_INLINE_MAX_BYTES
+
+    misses = []
+    for index, image_bytes in enumerate(images):
+        cached = result_cache.lookup_image_result(operation, image_bytes, model_params)
+        if cached is not None:
+            yield index, cached
+        else:
+            misses.append(index)
+    if not misses:
+        return
+
+    outputs = gpu_batch.iter_outputs(
+        operation,
+        [images[index] for index in misses],
+        [file_names[index] for index in misses],
+        model_params
+    )
+    for position, output in outputs:
+        index = misses[position]
+        if isinstance(output, Exception):
+            yield index, output
+            continue
+        try:
+            result = image_result(output, f"{object_prefix}/{file_names[index]}")
+        except Exception as e:
+            yield index, e
+            continue
+        result_cache.store_image_result(operation, images[index], model_params, result)
+        yield index, result
+
+
+def remove_background_batch(images):
+    return run_image_batch("remove_bg", images, {}, "removed-bg-images", "bg_removed_image.png")
+
+
+def upscale_image_batch(images, upscale_factor):
+    # Images big enough to need tiling are upscaled one by one; the rest share batched jobs
+    small = []
+    large = []
+    unreadable = []
+    for index, image_bytes in enumerate(images):
+        try:
+            with Image.open(BytesIO(image_bytes)) as image:
+                (large if image.width * image.height > const.TILED_UPSCALE_MIN_PIXELS else small).append(index)
+        except Exception as e:
+            # A corrupt ZIP member fails on its own instead of aborting the batch
+            unreadable.append((index, e))
+    yield from unreadable
+
+    batched = run_image_batch(
+        "upscale",
+        [images[index] for index in small],
+        upscale_model_params(upscale_factor),
+        "staging-upscaled-images",
+        "upscaled_image.png"
+    )
+    for position, result in batched:
+        yield small[position], result
 
-    # Get the output
-    output = run_request.output()
+    for index in large:
+        try:
+            yield index, upscale_image(const.UPSCALE_SERVICE_URL, images[index], upscale_factor)
+        except Exception as e:
+            yield index, e
 
-    # Assuming the output contains the image details
-    if 'image' in output and output['image'] is not None:
-        bucket_name = "readytoprint-images"
-        object_key = f"removed-bg-images/{filename}"
-        image = image_from_s3(bucket_name, object_key)
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        image_bytes = buffered.getvalue()
-        return image, object_key
 
-    else:
-        raise ValueError("Output does not contain a valid image URL")
+def pipeline_step(operation, **model_params):
+    """
+    Describe one operation of a fused pipeline, e.g. pipeline_step("remove_bg").
+    """
+    return {"type": operation, "model_params": model_params}
 
 
-def generate_flyer_image(prompt):
+def run_pipeline(image_bytes, steps, preview_only=False):
+    """
+    Run a chain of operations as a single RunPod job so intermediates stay on the worker.
+    Only the last step's output comes back, as (image, image_bytes, object_key).
+    """
+    # Get the current timestamp and format the filename
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    filename = f"{timestamp}_pipeline_image.png"
+
+    model_params = result_transport.request_delivery({
+        "steps": steps,
+        "aws_save_name": filename
+    }, preview_only)
+
+    # Run the whole chain as one job unless the same chain is already cached
+    return result_cache.cached_image_result(
+        "pipeline", image_bytes, model_params,
+        lambda: image_result(
+            runpod_client.run(input_staging.image_payload("pipeline", image_bytes, model_params)),
+            f"pipeline-images/{filename}",
+            preview_only
+        )
+    )
+
+
+def generate_flyer_image(prompt, preview_only=False):
     # Get the current timestamp and format the filename
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
     filename = f"{timestamp}_generated_flyer.png"
@@ -203,106 +273,87 @@ def generate_flyer_image(prompt):
         "input": {
             "image_url": dummy_image_url,  # This is just a placeholder
             "type": "generate",
-            "model_params": {
+            "model_params": result_transport.request_delivery({
                 "flux_prompt": prompt,
                 "aws_save_name": filename
-            }
+            }, preview_only)
         }
     }
 
-    # Run the request
-    endpoint = runpod.Endpoint("vdazldfyhyb2kr")
-    run_request = endpoint.run(payload)
-
-    # Check the status of the request
-    status = run_request.status()
-    while status in ["IN_QUEUE", "IN_PROGRESS"]:
-        time.sleep(1)
-        status = run_request.status()
+    # Run the request through the shared job client
+    output = runpod_client.run(payload)
 
-    # Get the output
-    output = run_request.output()
-
-    # Assuming the output contains the image details
-    if 'image' in output and output['image'] is not None:
-        bucket_name = "readytoprint-images"
-        object_key = f"generated-images/{filename}"
-        image = image_from_s3(bucket_name, object_key)
-        return image, object_key
-    else:
-        raise ValueError("Output does not contain a valid image URL")
+    return image_result(output, f"generated-images/{filename}", preview_only)
     
 
-def generate_with_YourDesigner(prompt, aspect_ratio, style, color_palette,seed=-1,magic_prompt_option="AUTO"):
-
-    url = "https://api.ideogram.ai/generate"
-    
-    if seed == -1:
-        payload = {
-            "image_request": {
-                "prompt": prompt,
-                "aspect_ratio": aspect_ratio,  # Use the correct aspect ratio format
-                "model": "V_2",
-                "magic_prompt_option": magic_prompt_option,
-                "style": style,
-                "color_palette": {
-                    "name": color_palette.upper() 
-                }
-            }
-        }
-    else:
-        payload = {
-            "image_request": {
-                "prompt": prompt,
-                "aspect_ratio": aspect_ratio,  # Use the correct aspect ratio format
-                "model": "V_2",
-                "magic_prompt_option": magic_prompt_option,
-                "style": style,
-                "seed":seed,
-                "color_palette": {
-                    "name": color_palette.upper() 
-                }
-            }
+def _YourDesigner_image_request(prompt, aspect_ratio, style, color_palette, seed, magic_prompt_option):
+    image_request = {
+        "prompt": prompt,
+        "aspect_ratio": aspect_ratio,  # Use the correct aspect ratio format
+        "model": "V_2",
+        "magic_prompt_option": magic_prompt_option,
+        "style": style,
+        "seed": seed,
+        "color_palette": {
+            "name": color_palette.upper() 
         }
-    if color_palette == "None":
-        del payload["image_request"]["color_palette"]
-
-    headers = {
-        "Api-Key": st.secrets["IDEOGRAM_API_KEY"],  # Replace with your actual API key
-        "Content-Type": "application/json"
     }
+    if color_palette == "None":
+        del image_request["color_palette"]
+    return image_request
 
-    response = requests.post(url, json=payload, headers=headers)
-
-    if response.status_code != 200:
-        raise ValueError(f"API request failed with status code {response.status_code}: {response.text}")
+def generate_with_YourDesigner(prompt, aspect_ratio, style, color_palette,seed=-1,magic_prompt_option="AUTO"):
 
-    response_json = response.json()
+    image_request = _YourDesigner_image_request(prompt, aspect_ratio, style, color_palette, seed, magic_prompt_option)
 
-    # Check if the response contains the 'data' field
-    if 'data' not in response_json or not response_json['data']:
-        raise ValueError("No image data found in the response.")
+    # A seeded request is deterministic, so a replay (rerun, undo, repeated modification) is served from disk
+    if seed != -1:
+        cached = generation_cache.get(image_request)
+        if cached is not None:
+            image, _, cached_seed, cached_prompt = cached
+            return image, cached_seed, cached_prompt
 
-    # Get the first image URL
-    image_info = response_json['data'][0]
-    image_url = image_info['url']
+    # Throttled or failed calls are retried; the seed is pinned first so a replay returns the same image
+    image_info = ideogram_client.generate(image_request)[0]
 
     # Download the image
-    image_response = requests.get(image_url)
-    if image_response.status_code != 200:
-        raise ValueError(f"Failed to download image from {image_url}")
-
-    image = Image.open(BytesIO(image_response.content))
+    image_bytes = ideogram_client.download(image_info['url'])
+    generation_cache.put(image_request, image_bytes, image_info['seed'], image_info['prompt'])
+    image = Image.open(BytesIO(image_bytes))
 
     # Return the image and additional info if needed
     return image, image_info['seed'] , image_info['prompt']
 
-def modify_prompt(prompt,modification_prompt):
-    client = OpenAI(
-        api_key=os.environ.get("OPENAI_API_KEY"), 
-        organization='org-4WOjbZKBTFaXvKMikqR2SuWx'
-    )
-    messages=[
+def generate_variants_with_YourDesigner(prompt, aspect_ratio, style, color_palette, num_images, seed=-1, magic_prompt_option="AUTO"):
+    """
+    Generate several variants of a prompt in as few Ideogram calls as possible.
+    Returns a list of dicts with the image, its encoded bytes, seed, prompt, resolution and url.
+    """
+    if num_images == 1:
+        image_request = _YourDesigner_image_request(prompt, aspect_ratio, style, color_palette, seed, magic_prompt_option)
+        image_infos = ideogram_client.generate(image_request)
+    else:
+        # Variants keep their own seeds, so an explicit seed is not forwarded
+        image_request = _YourDesigner_image_request(prompt, aspect_ratio, style, color_palette, -1, magic_prompt_option)
+        image_infos = ideogram_client.generate_variants(image_request, num_images)
+
+    # Download every variant at once
+    downloads = ideogram_client.download_many([image_info['url'] for image_info in image_infos])
+
+    return [
+        {
+            "image": Image.open(BytesIO(result_bytes)),
+            "image_bytes": result_bytes,
+            "seed": image_info['seed'],
+            "prompt": image_info['prompt'],
+            "resolution": image_info.get('resolution'),
+            "url": image_info['url']
+        }
+        for image_info, result_bytes in zip(image_infos, downloads)
+    ]
+
+def _modify_prompt_messages(prompt, modification_prompt):
+    return [
             {"role": "system", "content": "You are a helpful assistant."},
             {
                 "role": "user",
@@ -328,144 +379,246 @@ def modify_prompt(prompt,modification_prompt):
                 """
             }
         ]
-    completion = client.chat.completions.create(
+
+def stream_completion(messages, estimated_tokens, **kwargs):
+    """
+    Stream a GPT-4o chat completion on the shared client and yield the text as it arrives.
+    """
+    rate_limiter.acquire("openai", estimated_tokens)
+    stream = clients.get_openai_client().chat.completions.create(
         model="gpt-4o",
         messages=messages,
-        temperature=0.1
+        stream=True,
+        **kwargs
     )
-    response = completion.choices[0].message.content
-        # Split the string by double quotes and take the part in between the first and last quotes
-
-    return response
-
-
-def describe_image(image_bytes):
-    url = "https://api.ideogram.ai/describe"
-    files = {"image_file": image_bytes}
-    headers = {"Api-Key":  st.secrets["IDEOGRAM_API_KEY"]}
-
-    response = requests.post(url, files=files, headers=headers)
-
-    if response.status_code == 200:
-        print(response.json())
-        description = response.json().get('descriptions', 'No description found')[0]["text"]
-        return description
-    else:
-        raise ValueError(f"Failed to generate image description: {response.status_code}")
-
-def remix_image(image_file_path, prompt, aspect_ratio, style, color_palette, image_weight, api_key):
-    url = "https://api.ideogram.ai/remix"
-
-    # Open the image file directly
-    with open(image_file_path, 'rb') as image_file:
-        files = {
-            'image_file': ('image_file_path', image_file, 'image/png'),  # Use the actual file name and MIME type
-        }
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+def modify_prompt_stream(prompt, modification_prompt):
+    """
+    Yield the rewritten prompt piece by piece, e.g. for st.write_stream.
+    """
+    messages = _modify_prompt_messages(prompt, modification_prompt)
+    # The rewritten prompt is about as long as the original one
+    estimated_tokens = rate_limiter.estimate_tokens(messages[1]["content"], len(prompt) // 4)
+    return stream_completion(messages, estimated_tokens, temperature=0.1)
 
-        # Prepare the payload inside the 'image_request' wrapper
-        payload = {
-            "prompt": prompt,
-            "aspect_ratio": aspect_ratio,  # Use the correct aspect ratio format
-            "model": "V_2",
-            "magic_prompt_option": "ON",
-            "style": style,
-            "image_weight": image_weight,
-            "color_palette": {
-                "name": color_palette.upper()
+def modify_prompt(prompt,modification_prompt):
+    return "".join(modify_prompt_stream(prompt, modification_prompt))
+
+
+BULK_MODIFY_INSTRUCTIONS = """You modify prompts based on specific instructions. You will receive a JSON list of items, each with an "id", an "original_prompt" and a "modification".
+For every item, apply the changes described in the modification to the original prompt. Only the details mentioned in the modification are altered; the rest of the original prompt remains exactly the same.
+Return one result per item with the same "id" and the modified prompt."""
+
+BULK_MODIFY_SCHEMA = {
+    "name": "modified_prompts",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "integer"},
+                        "prompt": {"type": "string"}
+                    },
+                    "required": ["id", "prompt"],
+                    "additionalProperties": False
+                }
             }
-        }
-        if color_palette == "None":
-            del payload["color_palette"]
-        # Prepare the form-data
-        data = {
-            "image_request": json.dumps(payload)  # The payload must be serialized as a string
-        }
-
-        headers = {
-            "Api-Key": api_key  # No need to specify Content-Type when sending files
-        }
-
-        # Send the POST request to the remix API
-        response = requests.post(url, data=data, files=files, headers=headers)
-
-        if response.status_code != 200:
-            raise ValueError(f"API request failed with status code {response.status_code}: {response.text}")
-
-        response_json = response.json()
-
-        # Check if the response contains the 'data' field
-        if 'data' not in response_json or not response_json['data']:
-            raise ValueError("No image data found in the response.")
+        },
+        "required": ["results"],
+        "additionalProperties": False
+    }
+}
+
+def _bulk_rewrite_chunks(pairs):
+    # Split item indices into requests that stay within the token and item budgets
+    chunks = []
+    current = []
+    current_tokens = 0
+    for index, (prompt, modification) in enumerate(pairs):
+        # Input and output both hold roughly one copy of the prompt
+        item_tokens = rate_limiter.estimate_tokens(prompt + modification) + rate_limiter.estimate_tokens(prompt)
+        if current and (current_tokens + item_tokens > const.BULK_REWRITE_MAX_TOKENS or len(current) >= const.BULK_REWRITE_MAX_ITEMS):
+            chunks.append(current)
+            current = []
+            current_tokens = 0
+        current.append(index)
+        current_tokens += item_tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _modify_prompts_chunk(pairs, indices):
+    # Returns {index: modified prompt} for the items the model answered
+    items = [
+        {"id": index, "original_prompt": pairs[index][0], "modification": pairs[index][1]}
+        for index in indices
+    ]
+    messages = [
+        {"role": "system", "content": BULK_MODIFY_INSTRUCTIONS},
+        {"role": "user", "content": json.dumps(items)}
+    ]
+    max_tokens = sum(rate_limiter.estimate_tokens(pairs[index][0]) * 2 + 50 for index in indices)
+    rate_limiter.acquire("openai", rate_limiter.estimate_tokens(messages[0]["content"] + messages[1]["content"], max_tokens))
+
+    completion = clients.get_openai_client().chat.completions.create(
+        model="gpt-4o",
+        messages=messages,
+        temperature=0.1,
+        max_tokens=max_tokens,
+        response_format={"type": "json_schema", "json_schema": BULK_MODIFY_SCHEMA}
+    )
+    results = json.loads(completion.choices[0].message.content)["results"]
+    return {
+        result["id"]: result["prompt"]
+        for result in results
+        if result.get("id") in indices and isinstance(result.get("prompt"), str) and result["prompt"].strip()
+    }
 
-        remixed_images = []
-        
-        # Iterate through the returned images
-        for image_info in response_json['data']:
-            image_url = image_info['url']
+def modify_prompts_bulk(pairs):
+    """
+    Rewrite many (original prompt, modification) pairs with a few structured-output requests.
+    Returns the modified prompts in the same order. Items a request fails to return are rewritten one by one.
+    """
+    results = [None] * len(pairs)
 
-            # Download each image
-            image_response = requests.get(image_url)
-            if image_response.status_code != 200:
-                raise ValueError(f"Failed to download image from {image_url}")
+    def rewrite_chunk(indices):
+        try:
+            rewritten = _modify_prompts_chunk(pairs, indices)
+        except Exception as e:
+            print(f"Bulk prompt rewrite failed, falling back to single rewrites: {e}")
+            rewritten = {}
+        for index in indices:
+            results[index] = rewritten.get(index) or modify_prompt(*pairs[index])
 
-            image = Image.open(BytesIO(image_response.content))
+    with ThreadPoolExecutor(max_workers=const.BULK_REWRITE_WORKERS) as executor:
+        # Consume the results so a failed fallback raises here
+        list(executor.map(rewrite_chunk, _bulk_rewrite_chunks(pairs)))
+    return results
 
-            # Append each image, along with its seed, prompt, and resolution to the list
-            remixed_images.append({
-                "image": image,
-                "seed": image_info['seed'],
-                "prompt": image_info['prompt'],
-                "resolution": image_info['resolution'],
-                "url": image_url
-            })
 
-        # Return the list of remixed images
-        return remixed_images
+def describe_image(image_bytes):
+    # The same upload is only ever described once
+    cached = description_cache.get(image_bytes, "ideogram", "describe")
+    if cached is not None:
+        return cached
 
-def reimagine_image(image_bytes, selected_ratio, selected_style, selected_palette):
     try:
-        # Step 1: Encode the image as base64
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+        # Describing does not need print resolution, so a compact copy is uploaded
+        vision_bytes, _, _ = vision_preprocess.prepare(image_bytes, "ideogram")
+        descriptions = ideogram_client.describe(vision_bytes)
+    except ideogram_client.IdeogramError as e:
+        raise ValueError(f"Failed to generate image description: {e.status_code}")
+
+    if not descriptions:
+        return 'No description found'
+    description = descriptions[0]["text"]
+    description_cache.put(image_bytes, "ideogram", "describe", description)
+    return description
 
-        # Prepare the payload to send the base64 image directly
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {os.environ.get('OPENAI_API_KEY')}"
-        }
+def remix_image(image_file_path, prompt, aspect_ratio, style, color_palette, image_weight, api_key):
+    # Read the image once so retries can resend it
+    with open(image_file_path, 'rb') as image_file:
+        image_bytes = image_file.read()
 
-        payload = {
-            "model": "gpt-4o",
-            "messages": [
+    # Prepare the payload inside the 'image_request' wrapper
+    payload = {
+        "prompt": prompt,
+        "aspect_ratio": aspect_ratio,  # Use the correct aspect ratio format
+        "model": "V_2",
+        "magic_prompt_option": "ON",
+        "style": style,
+        "image_weight": image_weight,
+        "color_palette": {
+            "name": color_palette.upper()
+        }
+    }
+    if color_palette == "None":
+        del payload["color_palette"]
+
+    # Send the request to the remix API, retrying throttled calls
+    image_infos = ideogram_client.remix(payload, image_bytes, api_key)
+
+    # Download every returned image at once; callers reuse the bytes for display and download
+    downloads = ideogram_client.download_many([image_info['url'] for image_info in image_infos])
+
+    remixed_images = []
+
+    # Iterate through the returned images
+    for image_info, result_bytes in zip(image_infos, downloads):
+        # Append each image, along with its seed, prompt, and resolution to the list
+        remixed_images.append({
+            "image": Image.open(BytesIO(result_bytes)),
+            "image_bytes": result_bytes,
+            "seed": image_info['seed'],
+            "prompt": image_info['prompt'],
+            "resolution": image_info['resolution'],
+            "url": image_info['url']
+        })
+
+    # Return the list of remixed images
+    return remixed_images
+
+REIMAGINE_DESCRIPTION_PROMPT = "Describe this image for me as one paragraph (Make sure you preserve the text as it is). I want to give it as a prompt to a diffusion model."
+
+def describe_for_diffusion_stream(image_bytes):
+    """
+    Yield a GPT-4o description of an image as a diffusion prompt while it is generated.
+    Descriptions are cached per image and prompt template; a cached one is yielded in one piece.
+    """
+    detail = "low" if const.VISION_LOW_DETAIL else "high"
+    cache_template = f"{REIMAGINE_DESCRIPTION_PROMPT}|detail={detail}"
+    cached = description_cache.get(image_bytes, "openai:gpt-4o", cache_template)
+    if cached is not None:
+        yield cached
+        return
+
+    # Shrink the image to what GPT-4o actually looks at and encode it as base64
+    vision_bytes, mime_type, (width, height) = vision_preprocess.prepare(image_bytes, "openai-low" if detail == "low" else "openai")
+    base64_image = base64.b64encode(vision_bytes).decode('utf-8')
+
+    messages = [
+        {
+            "role": "user",
+            "content": [
                 {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Describe this image for me as one paragraph (Make sure you preserve the text as it is). I want to give it as a prompt to a diffusion model."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
+                    "type": "text",
+                    "text": REIMAGINE_DESCRIPTION_PROMPT
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{mime_type};base64,{base64_image}",
+                        "detail": detail
+                    }
                 }
-            ],
-            "max_tokens": 1000,
-            "temperature": 0.2
+            ]
         }
+    ]
+    max_tokens = 1000
+    estimated_tokens = rate_limiter.estimate_tokens(REIMAGINE_DESCRIPTION_PROMPT, max_tokens) + vision_preprocess.openai_image_tokens(width, height, detail)
 
-        # Make the request to OpenAI API
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
+    parts = []
+    for text in stream_completion(messages, estimated_tokens, max_tokens=max_tokens, temperature=0.2):
+        parts.append(text)
+        yield text
+    description_cache.put(image_bytes, "openai:gpt-4o", cache_template, "".join(parts))
 
-        if response.status_code != 200:
-            st.error(f"Failed to get a response from GPT-4o: {response.text}")
-            return None, None, None
+def describe_for_diffusion(image_bytes):
+    return "".join(describe_for_diffusion_stream(image_bytes))
 
-        # Extract the refined prompt from the response
-        refined_prompt = response.json()["choices"][0]["message"]["content"]
-        st.write(f"Refined prompt for diffusion model: {refined_prompt}")
+def reimagine_image(image_bytes, selected_ratio, selected_style, selected_palette):
+    # Step 1: Describe the image; retries on the same upload reuse the cached description
+    try:
+        # Show the description as it is written; generation starts as soon as it is complete
+        st.write("Refined prompt for diffusion model:")
+        refined_prompt = st.write_stream(describe_for_diffusion_stream(image_bytes))
 
     except Exception as e:
         st.error(f"Failed to generate prompt with GPT-4o: {str(e)}")
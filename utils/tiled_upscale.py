@@ -0,0 +1,126 @@
+# utils/tiled_upscale.py
+
+from collections import deque
+from io import BytesIO
+
+from PIL import Image, ImageChops
+
+import constants as const
+from utils import runpod_client, result_transport, input_staging
+
+
+def tile_starts(length, tile_size, overlap):
+    """
+    Start offsets of tiles covering [0, length) with at least `overlap` pixels shared between neighbours.
+    """
+    if length <= tile_size:
+        return [0]
+    stride = tile_size - overlap
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+
+def tile_boxes(width, height, tile_size, overlap):
+    """
+    Tile boxes (left, top, right, bottom) in raster order.
+    """
+    return [
+        (left, top, min(left + tile_size, width), min(top + tile_size, height))
+        for top in tile_starts(height, tile_size, overlap)
+        for left in tile_starts(width, tile_size, overlap)
+    ]
+
+
+def _ramp(length, ramp_width):
+    # 0 -> 255 over the first ramp_width pixels, then fully opaque
+    return [min(255, int(255 * (i + 1) / (ramp_width + 1))) for i in range(length)]
+
+
+def feather_mask(size, ramp_width, feather_left, feather_top):
+    """
+    Paste mask that fades a tile in over its left and/or top overlap with tiles that were already stitched.
+    """
+    width, height = size
+    mask_x = Image.new('L', (width, 1), 255)
+    if feather_left:
+        mask_x.putdata(_ramp(width, ramp_width))
+    mask_y = Image.new('L', (1, height), 255)
+    if feather_top:
+        mask_y.putdata(_ramp(height, ramp_width))
+    return ImageChops.multiply(mask_x.resize(size), mask_y.resize(size))
+
+
+def _tile_payload(image, box, model_params, tile_name):
+    buffered = BytesIO()
+    image.crop(box).save(buffered, format="PNG")
+    tile_params = {k: v for k, v in model_params.items() if k not in ["return_preview", "preview_max_size"]}
+    tile_params = result_transport.request_inline(dict(tile_params, tile=0, aws_save_name=tile_name))
+    # Tiles are small and never reused, so they travel inline rather than being staged in S3
+    return input_staging.image_payload("upscale", buffered.getvalue(), tile_params, input_mode="base64")
+
+
+def upscale_tiled(image_bytes, upscale_factor, model_params, object_key, preview_only=False):
+    """
+    Upscale an image by splitting it into overlapping tiles, upscaling them in parallel on the endpoint
+    and stitching the results with feathered blending across the overlaps.
+    Only TILED_UPSCALE_MAX_IN_FLIGHT tiles are submitted or held in memory at any time.
+    Returns (image, image_bytes, object_key) like the single-job upscale, with a preview in place of the
+    image and bytes when preview_only is set.
+    """
+    image = Image.open(BytesIO(image_bytes))
+    image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    width, height = image.size
+
+    tile_size = const.TILED_UPSCALE_TILE_SIZE
+    overlap = const.TILED_UPSCALE_OVERLAP
+    boxes = tile_boxes(width, height, tile_size, overlap)
+
+    canvas = Image.new(image.mode, (round(width * upscale_factor), round(height * upscale_factor)))
+    ramp_width = round(overlap * upscale_factor)
+    stem = object_key.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+    prefix = object_key.rsplit('/', 1)[0]
+
+    in_flight = deque()
+    next_index = 0
+    try:
+        # Tiles are stitched in raster order so every overlap blends into tiles that are already on the canvas
+        for index, box in enumerate(boxes):
+            while next_index < len(boxes) and len(in_flight) < const.TILED_UPSCALE_MAX_IN_FLIGHT:
+                tile_name = f"{stem}_tile_{next_index}.png"
+                payload = _tile_payload(image, boxes[next_index], model_params, tile_name)
+                in_flight.append((runpod_client.submit(payload), f"{prefix}/{tile_name}"))
+                next_index += 1
+
+            future, tile_key = in_flight.popleft()
+            output = future.result()
+            if not output or output.get('image') is None:
+                raise ValueError(f"Tile {index} output does not contain a valid image")
+            tile_bytes = result_transport.fetch_result(output, const.RESULTS_BUCKET, output.get('object_key', tile_key))
+
+            left, top = box[:2]
+            target_box = tuple(round(v * upscale_factor) for v in box)
+            target_size = (target_box[2] - target_box[0], target_box[3] - target_box[1])
+            tile = Image.open(BytesIO(tile_bytes)).convert(canvas.mode)
+            if tile.size != target_size:
+                tile = tile.resize(target_size, Image.LANCZOS)
+
+            mask = feather_mask(target_size, ramp_width, feather_left=left > 0, feather_top=top > 0)
+            canvas.paste(tile, target_box[:2], mask)
+    except Exception:
+        # Free the GPU capacity held by tiles we no longer need
+        for future, _ in in_flight:
+            future.cancel()
+        raise
+
+    buffered = BytesIO()
+    canvas.save(buffered, format="PNG")
+    result_bytes = buffered.getvalue()
+    result_transport.upload_object(const.RESULTS_BUCKET, object_key, result_bytes)
+    if preview_only:
+        # The full result is only served from S3, so hand back a shrunken copy of the canvas
+        canvas.thumbnail((const.PREVIEW_MAX_SIZE, const.PREVIEW_MAX_SIZE))
+        buffered = BytesIO()
+        canvas.save(buffered, format="PNG")
+        result_bytes = buffered.getvalue()
+    return Image.open(BytesIO(result_bytes)), result_bytes, object_key
@@ -0,0 +1,70 @@
+# utils/vision_preprocess.py
+
+import math
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+import constants as const
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+# image.info entries that can carry location, camera or colour data we do not send to the models
+_METADATA_KEYS = ("exif", "icc_profile", "xmp", "XML:com.adobe.xmp")
+_EXIF_ORIENTATION = 0x0112
+
+
+def target_size(width, height, max_side, short_side):
+    """
+    Scale (width, height) down so the long side fits max_side and the short side fits short_side. Never upscales.
+    """
+    scale = min(1.0, max_side / max(width, height), short_side / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def prepare(image_bytes, profile):
+    """
+    Resize and re-encode an image for a vision model profile from VISION_PROFILES.
+    Returns (encoded_bytes, mime_type, (width, height)). The re-encode drops EXIF and other metadata.
+    """
+    settings = const.VISION_PROFILES[profile]
+    image = Image.open(BytesIO(image_bytes))
+    source_format = image.format
+    size = target_size(image.width, image.height, settings["max_side"], settings["short_side"])
+
+    # Small inputs in a format the models accept are sent as they are when re-encoding would not shrink them,
+    # but only if they carry no metadata to strip and no rotation to apply
+    if (
+        size == image.size
+        and source_format in _MIME_TYPES
+        and len(image_bytes) <= 512 * 1024
+        and not any(key in image.info for key in _METADATA_KEYS)
+        and image.getexif().get(_EXIF_ORIENTATION, 1) == 1
+    ):
+        return image_bytes, _MIME_TYPES[source_format], size
+
+    # Apply the EXIF rotation before it is stripped, and flatten transparency onto white
+    image = ImageOps.exif_transpose(image)
+    size = target_size(image.width, image.height, settings["max_side"], settings["short_side"])
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    if size != image.size:
+        image = image.resize(size, Image.LANCZOS)
+
+    buffer = BytesIO()
+    image.save(buffer, format=settings["format"], quality=settings["quality"], optimize=True)
+    return buffer.getvalue(), _MIME_TYPES[settings["format"]], size
+
+
+def openai_image_tokens(width, height, detail):
+    """
+    Token cost of an image input to GPT-4o: a flat 85 in low detail, plus 170 per 512px tile in high detail.
+    """
+    if detail == "low":
+        return 85
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)